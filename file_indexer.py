@@ -2,21 +2,363 @@ import os
 import sqlite3
 import mimetypes
 import hashlib
+import heapq
+import json
+import mmap
+import pathlib
+import queue
+import re
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 from datetime import datetime
-from PyQt5.QtCore import QObject, pyqtSignal
 
-class FileIndexer(QObject):
-    indexing_progress = pyqtSignal(str)
-    indexing_finished = pyqtSignal(int)
-    indexing_error = pyqtSignal(str)
-    
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
-    def __init__(self, db_path="file_index.db"):
+try:
+    import xxhash
+except ImportError:  # 可选依赖，未安装时不提供 xxh3
+    xxhash = None
+
+
+# 可选的文件哈希算法：名称 -> 创建 hashlib 风格哈希对象的函数
+HASH_ALGORITHMS = {
+    'blake2b': lambda: hashlib.blake2b(digest_size=16),
+    'md5': hashlib.md5,
+}
+if xxhash is not None:
+    # 非加密哈希，速度最快
+    HASH_ALGORITHMS['xxh3'] = xxhash.xxh3_128
+
+
+def extract_regex_literals(regex):
+    """从正则表达式中提取匹配时必须出现的字面量片段，用于索引预过滤（无法分析时返回空列表）"""
+    try:
+        parsed = sre_parse.parse(regex)
+    except Exception:
+        return []
+    literals = []
+    _collect_regex_literals(parsed, literals)
+    return literals
+
+
+def _collect_regex_literals(items, literals):
+    current = []
+
+    def flush():
+        if current:
+            literals.append(''.join(current))
+            current.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+        elif op is sre_parse.AT:
+            # ^ $ \b 等零宽断言不影响字面量的连续性
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            flush()
+            _collect_regex_literals(av[-1], literals)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            flush()
+            # 至少出现一次的重复，其内部的字面量也是必需的
+            if av[0] >= 1:
+                _collect_regex_literals(av[2], literals)
+        else:
+            # 分支、字符集、通配符等无法确定具体字符，字面量在此中断
+            flush()
+    flush()
+
+
+def extract_match_tokens(literal):
+    """返回字面量中两侧都被截断的完整 ASCII 单词（首尾的片段可能只是更长单词的一部分）
+
+    这些单词在匹配的行中一定作为完整的词出现，可以用 FTS5 MATCH 预先筛选
+    """
+    if not literal.isascii():
+        return []
+    return [match.group() for match in re.finditer(r'[A-Za-z0-9]+', literal)
+            if match.start() > 0 and match.end() < len(literal)]
+
+
+@lru_cache(maxsize=128)
+def compile_search_regex(pattern):
+    """编译搜索用的正则（忽略大小写），相同的表达式只编译一次"""
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def sqlite_regexp(pattern, value):
+    """SQLite 的 REGEXP 函数：X REGEXP Y 会调用 regexp(Y, X)"""
+    if value is None:
+        return False
+    return compile_search_regex(pattern).search(value) is not None
+
+
+def is_database_locked(error):
+    """SQLite 错误是否因为数据库正被其他连接锁住（稍后重试即可成功）"""
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def text_trigrams(text):
+    """返回文本（转为小写后）包含的所有三字符片段"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# 内容行的 rowid 为 (file_id << CONTENT_ROWID_BITS) + 文件内序号，每个文件的内容行占据一段连续的 rowid，
+# 按文件删除或替换内容时只需按 rowid 区间定位
+CONTENT_ROWID_BITS = 32
+
+
+def file_rowid_range(file_id):
+    """返回某个文件的内容行可能占用的 rowid 区间 (low, high)，两端都包含"""
+    return file_id << CONTENT_ROWID_BITS, ((file_id + 1) << CONTENT_ROWID_BITS) - 1
+
+
+class ReadConnectionPool:
+    """只读连接池：复用已打开的连接（及其预编译语句缓存），避免每次查询都重新连接数据库"""
+
+    def __init__(self, db_path, max_idle=4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.closed = False
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def open_connection(self):
+        uri = pathlib.Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+        conn.create_function("regexp", 2, sqlite_regexp, deterministic=True)
+        conn.execute("PRAGMA cache_size=10000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.open_connection()
+
+    def release(self, conn):
+        # 清除借用期间设置的进度回调（搜索取消），避免影响下一次查询
+        conn.set_progress_handler(None, 0)
+        with self._lock:
+            if not self.closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class RowStream:
+    """把行迭代器包装成 cursor 风格的 fetchmany/fetchone 接口（用于按顺序连接的并行扫描结果）"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+
+    def fetchmany(self, size):
+        return list(islice(self._rows, size))
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+
+# 并行正则扫描工作进程中的状态：当前扫描代数（主进程共享的计数器）
+_scan_worker_state = {}
+
+
+def _init_scan_worker(generation):
+    _scan_worker_state['generation'] = generation
+
+
+def _scan_shard(task):
+    """在工作进程中依次查询一个分片的各个 rowid 区间，取满 limit 行即停止；所属的扫描已经结束时尽快返回空结果"""
+    db_path, generation, query, ranges, params, limit = task
+    current = _scan_worker_state['generation']
+    if current.value != generation:
+        return []
+    # 每个分片使用新的只读连接，用完即关闭：进程池常驻，缓存的连接会在数据库被删除重建后继续读取旧文件，
+    # 并且（在 Windows 上）让旧文件无法删除
+    conn = ReadConnectionPool(db_path).open_connection()
+    # 主进程把扫描代数加一即可中断正在执行的查询
+    conn.set_progress_handler(lambda: current.value != generation, 10000)
+    try:
+        rows = []
+        for low, high in ranges:
+            rows.extend(conn.execute(query, [low, high] + params).fetchall())
+            if limit and len(rows) >= limit:
+                del rows[limit:]
+                break
+        return rows
+    except sqlite3.OperationalError:
+        if current.value != generation:
+            return []
+        raise
+    finally:
+        conn.close()
+
+
+class QueryResultCache:
+    """搜索结果的 LRU 缓存，按估算的内存占用淘汰；指定 disk_path 时同时写入磁盘，重启后仍可命中
+
+    键的最后一项是索引版本（数据库 id 和索引代数），索引内容变化或数据库被重建后旧结果自然失效
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_path=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # 键 -> (缓存的值, 估算字节数)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk = None
+
+    @staticmethod
+    def estimate_size(results):
+        """粗略估算结果占用的内存（字符串长度加上每个字典的固定开销）"""
+        return sum(len(result['file_path']) + len(result['line_content']) + 300 for result in results)
+
+    def open_disk(self):
+        if self._disk is None and self.disk_path:
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS query_results (
+                    cache_key TEXT PRIMARY KEY,
+                    generation INTEGER,
+                    results TEXT,
+                    size INTEGER,
+                    last_used REAL
+                )
+            """)
+        return self._disk
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+            disk = self.open_disk()
+            if disk is None:
+                return None
+            cache_key = json.dumps(key, ensure_ascii=False)
+            row = disk.execute("SELECT results FROM query_results WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                return None
+            disk.execute("UPDATE query_results SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+            disk.commit()
+        results = json.loads(row[0])
+        self.put(key, results, write_disk=False)
+        return results
+
+    def put(self, key, results, write_disk=True, size=None):
+        """缓存结果列表；缓存其他可序列化为 JSON 的值（分页、计数）时由调用方给出 size"""
+        if size is None:
+            size = self.estimate_size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (results, size)
+            self._size += size
+            # 淘汰最久未使用的结果，直到回到内存上限以内
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+            disk = self.open_disk() if write_disk else None
+            if disk is None or size > self.max_disk_bytes:
+                return
+            # 键的最后一项是索引版本，其他版本的结果已经失效
+            generation = key[-1]
+            disk.execute("DELETE FROM query_results WHERE generation != ?", (generation,))
+            disk.execute("""
+                INSERT OR REPLACE INTO query_results (cache_key, generation, results, size, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            """, (json.dumps(key, ensure_ascii=False), generation,
+                  json.dumps(results, ensure_ascii=False), size, time.time()))
+            total = disk.execute("SELECT COALESCE(SUM(size), 0) FROM query_results").fetchone()[0]
+            while total > self.max_disk_bytes:
+                cache_key, evicted_size = disk.execute(
+                    "SELECT cache_key, size FROM query_results ORDER BY last_used LIMIT 1").fetchone()
+                disk.execute("DELETE FROM query_results WHERE cache_key = ?", (cache_key,))
+                total -= evicted_size
+            disk.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_results")
+                self._disk.commit()
+
+
+# 按数据库路径共享的只读连接池和表结构信息（同一进程内的所有 FileIndexer 共用）
+_read_pools = {}
+_schema_cache = {}
+_scan_pools = {}  # 进程数 -> (进程池, 扫描代数, 锁)
+_registry_lock = threading.Lock()
+
+
+def get_scan_pool(workers):
+    """返回常驻的并行扫描进程池（按进程数复用），以及用于停止扫描的共享计数器和串行化扫描的锁"""
+    with _registry_lock:
+        entry = _scan_pools.get(workers)
+        if entry is None:
+            # 只在首次并行扫描时导入，不拖慢程序启动
+            import multiprocessing
+            # 界面进程中有多个线程，用 spawn 而不是 fork 创建工作进程
+            context = multiprocessing.get_context('spawn')
+            generation = context.RawValue('q', 0)
+            pool = context.Pool(workers, initializer=_init_scan_worker, initargs=(generation,))
+            entry = _scan_pools[workers] = (pool, generation, threading.Lock())
+        return entry
+
+
+class FileIndexer:
+    """索引和搜索引擎，不依赖 Qt
+
+    进度消息、错误和完成通知通过回调报告（未设置的回调忽略）；
+    界面使用 file_indexer_qt.QtFileIndexer，它把这些通知转为 Qt 信号
+    """
+
+    def __init__(self, db_path="file_index.db", progress_callback=None, error_callback=None,
+                 finished_callback=None):
         super().__init__()
         self.db_path = db_path
+        self.progress_callback = progress_callback
+        self.error_callback = error_callback
+        self.finished_callback = finished_callback
         self.conn = None
         self.cursor = None
         self.fts_enabled = False
+        # 内容表：'file_contents'（每行一条记录）或 'file_chunks'（按块存储）
+        self.content_table = 'file_contents'
+        # 三元组索引类型：'fts5'（FTS5 trigram 分词器）、'table'（自建倒排表）或 None
+        self.trigram_mode = None
+        # 写连接上已知的目录：规范化路径 -> 目录 id
+        self.dir_id_cache = {}
+        # 写连接上各文件下一条内容行的序号：file_id -> 序号
+        self.content_seq = {}
         
         # 支持的文本文件扩展名（白名单）
         self.text_extensions = {
@@ -157,11 +499,83 @@ class FileIndexer(QObject):
         
         # 最大文件大小（默认5MB）
         self.max_file_size = 5 * 1024 * 1024
+        # 单行最大长度，超过的行会被跳过（大文件模式下切分为多段）
+        self.max_line_length = 1000
+
+        # 大文件模式：不再按 max_file_size 跳过文件、不限制行数，改为按单文件字节预算流式索引
+        self.large_file_mode = False
+        # 大文件模式下每个文件最多索引的字节数（按字符近似，0 表示不限制）
+        self.file_byte_budget = 256 * 1024 * 1024
+        # 每次读取并写入的行数，限制单个文件占用的内存
+        self.read_window_lines = 5000
+        # 检查文件开头多少字节中是否含有 NUL 字节，含有则视为二进制文件跳过
+        self.binary_sniff_size = 8192
+
+        # 并行索引的工作线程数（0 表示单线程索引）
+        self.index_workers = 0
+        # 并行索引时每批写入的文件数
+        self.write_batch_size = 200
+
+        # 目录扫描线程数（网络文件系统上每次 stat 都是一次往返，可适当调大）
+        self.scan_threads = 1
+
+        # 新建索引时的内容存储布局：'line'（每行一条记录）或 'chunk'（多行合并为块，索引更小）
+        self.storage_layout = 'line'
+        # 按块存储时每块的最大字符数
+        self.chunk_size = 16 * 1024
+
+        # 是否建立三元组索引（加速正则和子串搜索，索引体积会增大）
+        self.trigram_index = False
+        # 自建三元组表预过滤最多使用的三元组数：每个三元组是 INTERSECT 的一个分支，
+        # SQLite 限制一个复合查询最多 500 个分支，分支过多也只会让查询更慢
+        self.max_trigram_terms = 32
+
+        # 严格模式：增量更新时对所有文件计算哈希，而不是信任 (大小, 修改时间, inode)
+        self.paranoid_check = False
+        # 文件哈希算法（见 HASH_ALGORITHMS），哈希覆盖整个文件
+        self.hash_algorithm = 'blake2b'
+
+        # 单次搜索最多返回的结果数（search_content / iter_search_results）
+        self.max_search_results = 10000
+        # 分页搜索（search_page）每页的结果数
+        self.search_page_size = 500
+        # 无法用索引预过滤的正则搜索使用的扫描进程数（0 表示在当前进程中扫描），以及每个分片包含的文件总大小
+        self.regex_scan_workers = 0
+        self.regex_scan_shard_bytes = 2 * 1024 * 1024
+        # 普通关键词搜索按子串匹配（与 LIKE 相同，"ello" 能找到 "hello"）；设为 False 时使用 FTS5 按词匹配，
+        # 速度更快，但只匹配完整的词（经过 porter 词干提取）。按相关度搜索始终按词匹配
+        self.substring_search = True
+        # 按相关度搜索（search_ranked）返回的文件数，以及每个文件最多返回的匹配行数
+        self.ranked_top_files = 100
+        self.ranked_lines_per_file = 50
+
+        # 搜索结果缓存的内存上限（0 表示不缓存），以及可选的磁盘缓存文件
+        self.result_cache_size = 64 * 1024 * 1024
+        self.result_cache_path = None
+        self.result_cache = None
+
+    def report_progress(self, message):
+        """报告进度消息"""
+        if self.progress_callback:
+            self.progress_callback(message)
+
+    def report_error(self, message):
+        """报告错误消息"""
+        if self.error_callback:
+            self.error_callback(message)
+
+    def report_finished(self, count):
+        """报告索引操作完成（参数为处理的文件数）"""
+        if self.finished_callback:
+            self.finished_callback(count)
 
     def connect_db(self):
         try:
             self.conn = sqlite3.connect(self.db_path)
+            self.conn.create_function("regexp", 2, sqlite_regexp, deterministic=True)
             self.cursor = self.conn.cursor()
+            self.dir_id_cache = {}
+            self.content_seq = {}
             
             # 启用 WAL 模式以提高性能
             self.cursor.execute("PRAGMA journal_mode=WAL")
@@ -172,23 +586,34 @@ class FileIndexer(QObject):
             self.create_tables()
             return True
         except sqlite3.Error as e:
-            self.indexing_error.emit(f"数据库连接或创建失败: {e}")
+            self.report_error(f"数据库连接或创建失败: {e}")
             return False
 
     def create_tables(self):
         # 首先检查是否需要升级表结构
         self.cursor.execute("PRAGMA table_info(files)")
         columns = [col[1] for col in self.cursor.fetchall()]
+        tables = dict(self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table'").fetchall())
         
         # 如果表存在但缺少新列，则添加它们
-        if 'files' in [t[0] for t in self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]:
+        backfill_directories = False
+        if 'files' in tables:
             if 'file_hash' not in columns:
                 self.cursor.execute("ALTER TABLE files ADD COLUMN file_hash TEXT")
-                self.indexing_progress.emit("升级数据库：添加 file_hash 列")
+                self.report_progress("升级数据库：添加 file_hash 列")
             
             if 'modified_time' not in columns:
                 self.cursor.execute("ALTER TABLE files ADD COLUMN modified_time REAL")
-                self.indexing_progress.emit("升级数据库：添加 modified_time 列")
+                self.report_progress("升级数据库：添加 modified_time 列")
+
+            if 'mtime_ns' not in columns:
+                self.cursor.execute("ALTER TABLE files ADD COLUMN mtime_ns INTEGER")
+                self.cursor.execute("ALTER TABLE files ADD COLUMN inode INTEGER")
+                self.report_progress("升级数据库：添加 mtime_ns 和 inode 列")
+
+            if 'dir_id' not in columns:
+                self.cursor.execute("ALTER TABLE files ADD COLUMN dir_id INTEGER")
+                backfill_directories = True
         
         # 创建或更新文件表
         self.cursor.execute("""
@@ -200,37 +625,21 @@ class FileIndexer(QObject):
                 file_ext TEXT,
                 file_hash TEXT,
                 modified_time REAL,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                dir_id INTEGER,
                 indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        
-        # 检查是否支持 FTS5
-        try:
-            self.cursor.execute("SELECT fts5_version()")
-            # 如果支持 FTS5，创建虚拟表（注意：FTS5 中不需要指定列类型）
-            self.cursor.execute("""
-                CREATE VIRTUAL TABLE IF NOT EXISTS file_contents USING fts5(
-                    file_id,
-                    line_number,
-                    content,
-                    tokenize = 'porter unicode61'
-                )
-            """)
-            self.fts_enabled = True
-            self.indexing_progress.emit("使用 FTS5 全文搜索")
-        except sqlite3.Error:
-            # 如果不支持 FTS5，使用普通表
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS file_contents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_id INTEGER NOT NULL,
-                    line_number INTEGER NOT NULL,
-                    content TEXT NOT NULL,
-                    FOREIGN KEY (file_id) REFERENCES files (id)
-                )
-            """)
-            self.fts_enabled = False
-            self.indexing_progress.emit("FTS5 不可用，使用普通搜索")
+
+        # 目录表：每个文件所在的目录一条记录（路径已规范化），用于按文件夹范围查询
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS directories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                parent_id INTEGER
+            )
+        """)
         
         # 创建索引以提高查询性能
         self.cursor.execute("""
@@ -242,38 +651,606 @@ class FileIndexer(QObject):
         self.cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_files_hash ON files(file_hash)
         """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir_id)
+        """)
+
+        if backfill_directories:
+            rows = self.cursor.execute("SELECT id, file_path FROM files").fetchall()
+            updates = [(self.get_dir_id(os.path.dirname(file_path)), file_id) for file_id, file_path in rows]
+            self.cursor.executemany("UPDATE files SET dir_id = ? WHERE id = ?", updates)
+            self.report_progress("升级数据库：建立目录表")
+
+        # 索引元数据：数据库 id（创建数据库时随机生成，区分删除后重建的数据库）、
+        # 索引代数（每次索引内容变化后加一）和最后索引时间；前两项一起作为结果缓存的版本
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS index_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        """)
+        self.cursor.execute("INSERT OR IGNORE INTO index_meta (key, value) VALUES ('db_id', ?)",
+                            (secrets.randbits(62),))
+
+        self.create_content_tables(tables)
+        self.create_stats_table(tables)
+        
+        self.conn.commit()
+        self.store_schema_state()
+
+    def create_stats_table(self, tables):
+        """创建按扩展名汇总的统计表，由 files 表上的触发器随增删改同步维护，读取索引信息时无需扫描 files 表"""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS file_stats (
+                file_ext TEXT PRIMARY KEY,
+                file_count INTEGER NOT NULL,
+                total_size INTEGER NOT NULL
+            )
+        """)
+        self.create_stats_triggers()
+        if 'file_stats' not in tables:
+            # 旧版本数据库：按现有文件记录回填一次
+            self.cursor.execute("""
+                INSERT INTO file_stats (file_ext, file_count, total_size)
+                SELECT IFNULL(file_ext, ''), COUNT(*), IFNULL(SUM(file_size), 0) FROM files GROUP BY IFNULL(file_ext, '')
+            """)
+            last_indexed = self.cursor.execute("SELECT MAX(indexed_at) FROM files").fetchone()[0]
+            if last_indexed:
+                self.cursor.execute("""
+                    INSERT OR REPLACE INTO index_meta (key, value) VALUES ('last_indexed', ?)
+                """, (last_indexed,))
+
+    def create_stats_triggers(self):
+        """新增、删除文件记录，或修改其大小/扩展名/索引时间时，同步更新 file_stats 和最后索引时间"""
+        add_new = """
+            INSERT INTO file_stats (file_ext, file_count, total_size)
+            VALUES (IFNULL(NEW.file_ext, ''), 1, IFNULL(NEW.file_size, 0))
+            ON CONFLICT(file_ext) DO UPDATE SET file_count = file_count + 1,
+                                                total_size = total_size + excluded.total_size;
+            INSERT INTO index_meta (key, value) VALUES ('last_indexed', NEW.indexed_at)
+            ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value);
+        """
+        remove_old = """
+            UPDATE file_stats SET file_count = file_count - 1, total_size = total_size - IFNULL(OLD.file_size, 0)
+            WHERE file_ext = IFNULL(OLD.file_ext, '');
+            DELETE FROM file_stats WHERE file_ext = IFNULL(OLD.file_ext, '') AND file_count <= 0;
+        """
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS files_stats_insert AFTER INSERT ON files BEGIN {add_new} END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS files_stats_delete AFTER DELETE ON files BEGIN {remove_old} END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS files_stats_update AFTER UPDATE OF file_size, file_ext, indexed_at ON files
+            BEGIN {remove_old} {add_new} END
+        """)
+
+    def drop_stats_triggers(self):
+        """删除统计触发器（整表清空前调用，清空后重新创建）"""
+        for trigger in ('files_stats_insert', 'files_stats_delete', 'files_stats_update'):
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    def create_content_tables(self, tables):
+        """创建内容表和三元组索引；已有内容表时沿用其存储布局"""
+        if 'file_chunks' in tables:
+            self.content_table = 'file_chunks'
+        elif 'file_contents' in tables:
+            self.content_table = 'file_contents'
+        else:
+            self.content_table = 'file_chunks' if self.storage_layout == 'chunk' else 'file_contents'
+        existing_sql = tables.get(self.content_table)
+
+        # 检查是否支持 FTS5（已有内容表时以实际表结构为准）
+        try:
+            if existing_sql and 'VIRTUAL TABLE' not in existing_sql.upper():
+                raise sqlite3.OperationalError(f"{self.content_table} 是普通表")
+            # 如果支持 FTS5，创建虚拟表（注意：FTS5 中不需要指定列类型）
+            # file_id 等辅助列声明为 UNINDEXED，不进入全文索引
+            if self.content_table == 'file_chunks':
+                self.cursor.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS file_chunks USING fts5(
+                        file_id UNINDEXED,
+                        line_map UNINDEXED,
+                        content,
+                        tokenize = 'porter unicode61'
+                    )
+                """)
+            else:
+                self.cursor.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS file_contents USING fts5(
+                        file_id UNINDEXED,
+                        line_number UNINDEXED,
+                        content,
+                        tokenize = 'porter unicode61'
+                    )
+                """)
+            self.fts_enabled = True
+            self.report_progress("使用 FTS5 全文搜索")
+        except sqlite3.Error:
+            # 如果不支持 FTS5，使用普通表
+            if self.content_table == 'file_chunks':
+                self.cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS file_chunks (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_id INTEGER NOT NULL,
+                        line_map BLOB NOT NULL,
+                        content TEXT NOT NULL,
+                        FOREIGN KEY (file_id) REFERENCES files (id)
+                    )
+                """)
+            else:
+                self.cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS file_contents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_id INTEGER NOT NULL,
+                        line_number INTEGER NOT NULL,
+                        content TEXT NOT NULL,
+                        FOREIGN KEY (file_id) REFERENCES files (id)
+                    )
+                """)
+            self.fts_enabled = False
+            self.report_progress("FTS5 不可用，使用普通搜索")
+
+        # 旧版本的内容行按插入顺序编号，改为按文件编号（见 file_rowid_range）
+        renumbered = existing_sql is not None and self.has_legacy_rowids()
+        if renumbered:
+            self.renumber_content_rows(existing_sql)
         
         if not self.fts_enabled:
             # 为普通表创建额外的索引
+            if self.content_table == 'file_chunks':
+                self.cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_file_chunks_file_id ON file_chunks(file_id)
+                """)
+            else:
+                self.cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_file_contents_file_id ON file_contents(file_id)
+                """)
+                self.cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_file_contents_content ON file_contents(content)
+                """)
+
+        # 三元组索引（已存在时始终维护，不存在时按设置创建）
+        if renumbered and ('file_trigrams' in tables or 'content_trigrams' in tables):
+            # 三元组索引按内容行的 rowid 记录，随内容行一起重建
+            self.cursor.execute("DROP TABLE IF EXISTS file_trigrams")
+            self.cursor.execute("DROP TABLE IF EXISTS content_trigrams")
+            self.create_trigram_index()
+        elif 'file_trigrams' in tables:
+            self.trigram_mode = 'fts5'
+        elif 'content_trigrams' in tables:
+            self.trigram_mode = 'table'
+        elif self.trigram_index:
+            self.create_trigram_index()
+        else:
+            self.trigram_mode = None
+
+    def has_legacy_rowids(self):
+        """内容表中是否还有旧版本按插入顺序编号的内容行"""
+        self.cursor.execute(f"SELECT rowid FROM {self.content_table} ORDER BY rowid LIMIT 1")
+        row = self.cursor.fetchone()
+        return row is not None and row[0] < (1 << CONTENT_ROWID_BITS)
+
+    def renumber_content_rows(self, create_sql):
+        """把旧版本索引的内容行复制到按文件编号 rowid 的新表中（全文索引随之重建），只需执行一次"""
+        table = self.content_table
+        columns = "file_id, line_map, content" if table == 'file_chunks' else "file_id, line_number, content"
+        self.report_progress("升级数据库：按文件重新编排内容行，需要重建全文索引，请稍候...")
+        self.cursor.execute(f"DROP TABLE IF EXISTS {table}_renumbered")
+        self.cursor.execute(create_sql.replace(table, f"{table}_renumbered", 1))
+        self.cursor.execute(f"""
+            INSERT INTO {table}_renumbered (rowid, {columns})
+            SELECT (file_id << {CONTENT_ROWID_BITS}) + ROW_NUMBER() OVER (PARTITION BY file_id ORDER BY rowid) - 1,
+                   {columns}
+            FROM {table}
+        """)
+        self.cursor.execute(f"DROP TABLE {table}")
+        self.cursor.execute(f"ALTER TABLE {table}_renumbered RENAME TO {table}")
+        # 释放旧表占用的空间
+        self.conn.commit()
+        self.cursor.execute("VACUUM")
+
+    def create_trigram_index(self):
+        """创建三元组索引，优先使用 FTS5 的 trigram 分词器，不可用时使用自建倒排表"""
+        try:
+            # 无内容表（content=''），只保存索引，rowid 与 file_contents 的 rowid 一致
             self.cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_file_contents_file_id ON file_contents(file_id)
+                CREATE VIRTUAL TABLE file_trigrams USING fts5(
+                    content,
+                    content = '',
+                    tokenize = 'trigram'
+                )
             """)
+            self.trigram_mode = 'fts5'
+            self.report_progress("使用 FTS5 trigram 三元组索引")
+            self.cursor.execute(
+                f"INSERT INTO file_trigrams (rowid, content) SELECT rowid, content FROM {self.content_table}"
+            )
+        except sqlite3.Error:
             self.cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_file_contents_content ON file_contents(content)
+                CREATE TABLE IF NOT EXISTS content_trigrams (
+                    trigram TEXT NOT NULL,
+                    content_id INTEGER NOT NULL,
+                    PRIMARY KEY (trigram, content_id)
+                ) WITHOUT ROWID
             """)
-        
-        self.conn.commit()
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_content_trigrams_content_id ON content_trigrams(content_id)
+            """)
+            self.trigram_mode = 'table'
+            self.report_progress("FTS5 trigram 不可用，使用三元组倒排表")
+            self.add_trigram_postings(0, (1 << 63) - 1)
+
+    def add_trigram_postings(self, low, high):
+        """为 rowid 在 [low, high] 区间内的内容行写入三元组倒排记录"""
+        self.cursor.execute(f"SELECT rowid, content FROM {self.content_table} WHERE rowid BETWEEN ? AND ?",
+                            (low, high))
+        while True:
+            rows = self.cursor.fetchmany(1000)
+            if not rows:
+                break
+            postings = [(trigram, rowid) for rowid, content in rows for trigram in text_trigrams(content)]
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO content_trigrams (trigram, content_id) VALUES (?, ?)", postings
+            )
+
+    def store_schema_state(self):
+        """记录表结构信息，后续查询无需再检查/创建表"""
+        with _registry_lock:
+            _schema_cache[os.path.abspath(self.db_path)] = {
+                'fts_enabled': self.fts_enabled,
+                'content_table': self.content_table,
+                'trigram_mode': self.trigram_mode
+            }
+
+    def load_schema_state(self):
+        """获取缓存的表结构信息，只在首次访问某个数据库时连接并检查/创建表"""
+        key = os.path.abspath(self.db_path)
+        with _registry_lock:
+            state = _schema_cache.get(key)
+        if state is None:
+            if not self.connect_db():
+                return None
+            self.conn.close()
+            self.conn = None
+            self.cursor = None
+            with _registry_lock:
+                state = _schema_cache[key]
+        self.fts_enabled = state['fts_enabled']
+        self.content_table = state['content_table']
+        self.trigram_mode = state['trigram_mode']
+        return state
+
+    @contextmanager
+    def read_connection(self):
+        """从连接池借用一个只读连接，用完后归还"""
+        key = os.path.abspath(self.db_path)
+        with _registry_lock:
+            pool = _read_pools.get(key)
+            if pool is None:
+                pool = _read_pools[key] = ReadConnectionPool(key)
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def close_read_connections(db_path="file_index.db"):
+        """关闭某个数据库的所有只读连接并清除结构缓存（删除或重建数据库文件前调用）"""
+        key = os.path.abspath(db_path)
+        with _registry_lock:
+            pool = _read_pools.pop(key, None)
+            _schema_cache.pop(key, None)
+        if pool:
+            pool.close_all()
+
+    def database_files(self):
+        """索引数据库自身的文件（含 WAL、共享内存和回滚日志文件）的绝对路径集合"""
+        db_path = os.path.abspath(self.db_path)
+        return {db_path + suffix for suffix in ('', '-wal', '-shm', '-journal')}
+
+    def build_match_query(self, keyword, prefix=False):
+        """把关键词转换为 FTS5 查询：每个词加引号作为短语，避免特殊字符导致语法错误
+
+        prefix 为真时最后一个词按前缀匹配（"term"*），用于边输入边搜索
+        """
+        terms = keyword.split() or [keyword]
+        query = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        return query + '*' if prefix else query
+
+    def build_prefix_matcher(self, keyword):
+        """返回在内存中判断一行是否匹配前缀搜索的函数，用于在较短前缀的结果上细化较长的查询
+
+        只有结果与数据库查询完全一致时才能细化，否则返回 None，需要重新查询：
+        全文搜索（只有最后一个词按前缀匹配，并且经过 porter 词干提取）、按块存储（LIKE 以整块判断）
+        以及包含 LIKE 通配符 % _ 的关键词都无法在内存中等价判断
+        """
+        word_match = self.fts_enabled and not self.substring_search
+        if word_match or self.content_table == 'file_chunks' or '%' in keyword or '_' in keyword:
+            return None
+        # 与 LIKE 一致：只忽略 ASCII 字母的大小写
+        pattern = re.compile(re.escape(keyword), re.IGNORECASE | re.ASCII)
+        return pattern.search
+
+    def build_trigram_filter(self, literals):
+        """根据必需的字面量构造三元组预过滤条件，返回 (SQL 片段, 参数)；无法使用索引时返回 None"""
+        literals = [literal for literal in literals if len(literal) >= 3]
+        if not self.trigram_mode or not literals:
+            return None
+        if self.trigram_mode == 'fts5':
+            expr = ' AND '.join('"' + literal.replace('"', '""') + '"' for literal in literals)
+            return "fc.rowid IN (SELECT rowid FROM file_trigrams WHERE file_trigrams MATCH ?)", [expr]
+        # 每个字面量取首尾相接、不重叠的三元组即可覆盖全部字符，其余三元组对筛选帮助不大
+        trigrams = {}
+        for literal in literals:
+            lowered = literal.lower()
+            starts = list(range(0, len(lowered) - 2, 3))
+            if starts[-1] != len(lowered) - 3:
+                starts.append(len(lowered) - 3)
+            for start in starts:
+                trigrams.setdefault(lowered[start:start + 3], None)
+                if len(trigrams) >= self.max_trigram_terms:
+                    break
+            if len(trigrams) >= self.max_trigram_terms:
+                break
+        trigrams = list(trigrams)
+        subqueries = " INTERSECT ".join(["SELECT content_id FROM content_trigrams WHERE trigram = ?"] * len(trigrams))
+        return f"fc.rowid IN ({subqueries})", trigrams
+
+    def build_chunks(self, rows):
+        """把按行排列的内容 (file_id, line_number, content) 合并为块 (file_id, line_map, content)"""
+        chunks = []
+        current_file_id = None
+        line_numbers = array('I')
+        lines = []
+        chunk_chars = 0
+
+        for file_id, line_number, content in rows:
+            if file_id != current_file_id or chunk_chars >= self.chunk_size:
+                if lines:
+                    chunks.append((current_file_id, line_numbers.tobytes(), '\n'.join(lines)))
+                current_file_id = file_id
+                line_numbers = array('I')
+                lines = []
+                chunk_chars = 0
+            line_numbers.append(line_number)
+            lines.append(content)
+            chunk_chars += len(content) + 1
+
+        if lines:
+            chunks.append((current_file_id, line_numbers.tobytes(), '\n'.join(lines)))
+        return chunks
+
+    def iter_chunk_lines(self, line_map, content):
+        """把块还原为 (行号, 行内容)"""
+        line_numbers = array('I')
+        line_numbers.frombytes(line_map)
+        return zip(line_numbers, content.split('\n'))
+
+    def assign_content_rowids(self, rows):
+        """为 (file_id, ...) 内容行分配 rowid，返回 ((rowid, file_id, ...) 列表, 每个文件本次写入的 rowid 区间)"""
+        numbered = []
+        ranges = {}
+        for row in rows:
+            file_id = row[0]
+            seq = self.content_seq.get(file_id)
+            if seq is None:
+                # 首次写入该文件：接在已有内容行之后（通常没有）
+                low, high = file_rowid_range(file_id)
+                self.cursor.execute(f"""
+                    SELECT rowid FROM {self.content_table} WHERE rowid BETWEEN ? AND ?
+                    ORDER BY rowid DESC LIMIT 1
+                """, (low, high))
+                last_row = self.cursor.fetchone()
+                seq = last_row[0] - low + 1 if last_row else 0
+            rowid = (file_id << CONTENT_ROWID_BITS) + seq
+            self.content_seq[file_id] = seq + 1
+            numbered.append((rowid,) + tuple(row))
+            ranges.setdefault(file_id, [rowid, rowid])[1] = rowid
+        return numbered, ranges.values()
+
+    def insert_content_rows(self, rows):
+        """批量写入内容行 (file_id, line_number, content)，按块存储时先合并为块，并同步维护三元组索引"""
+        if self.content_table == 'file_chunks':
+            rows = self.build_chunks(rows)
+            insert_sql = "INSERT INTO file_chunks (rowid, file_id, line_map, content) VALUES (?, ?, ?, ?)"
+        else:
+            insert_sql = "INSERT INTO file_contents (rowid, file_id, line_number, content) VALUES (?, ?, ?, ?)"
+        rows, ranges = self.assign_content_rowids(rows)
+
+        for start in range(0, len(rows), 1000):
+            self.cursor.executemany(insert_sql, rows[start:start + 1000])
+
+        for low, high in ranges:
+            if self.trigram_mode == 'fts5':
+                self.cursor.execute(f"""
+                    INSERT INTO file_trigrams (rowid, content)
+                    SELECT rowid, content FROM {self.content_table} WHERE rowid BETWEEN ? AND ?
+                """, (low, high))
+            elif self.trigram_mode == 'table':
+                self.add_trigram_postings(low, high)
+
+    def delete_file_contents(self, file_id):
+        """删除某个文件的全部内容行，并同步维护三元组索引（按 rowid 区间定位，代价只与该文件的行数有关）"""
+        low, high = file_rowid_range(file_id)
+        if self.trigram_mode == 'fts5':
+            # 无内容表需要提供原始内容才能删除
+            self.cursor.execute(f"""
+                INSERT INTO file_trigrams (file_trigrams, rowid, content)
+                SELECT 'delete', rowid, content FROM {self.content_table} WHERE rowid BETWEEN ? AND ?
+            """, (low, high))
+        elif self.trigram_mode == 'table':
+            self.cursor.execute("DELETE FROM content_trigrams WHERE content_id BETWEEN ? AND ?", (low, high))
+        self.cursor.execute(f"DELETE FROM {self.content_table} WHERE rowid BETWEEN ? AND ?", (low, high))
+        self.content_seq.pop(file_id, None)
+
+    @staticmethod
+    def normalize_dir_path(dir_path):
+        """目录表中的路径统一为规范形式（Windows 上不区分大小写，分隔符统一）"""
+        return os.path.normcase(os.path.normpath(dir_path))
+
+    def get_dir_id(self, dir_path):
+        """返回目录的 id，目录（及其上级目录）不在目录表中时逐级添加"""
+        dir_path = self.normalize_dir_path(dir_path)
+        dir_id = self.dir_id_cache.get(dir_path)
+        if dir_id is not None:
+            return dir_id
+
+        row = self.cursor.execute("SELECT id FROM directories WHERE path = ?", (dir_path,)).fetchone()
+        if row:
+            dir_id = row[0]
+        else:
+            parent_path = os.path.dirname(dir_path)
+            parent_id = self.get_dir_id(parent_path) if parent_path != dir_path else None
+            self.cursor.execute("INSERT INTO directories (path, parent_id) VALUES (?, ?)", (dir_path, parent_id))
+            dir_id = self.cursor.lastrowid
+        self.dir_id_cache[dir_path] = dir_id
+        return dir_id
+
+    def build_folder_filter(self, folder_path, column="f.dir_id"):
+        """限定在某个文件夹（含子文件夹）内的条件，返回 (条件, 参数)
+
+        子目录的路径都以 "文件夹路径 + 分隔符" 开头，在目录表的路径索引上是一个连续区间，
+        因此不需要 LIKE 前缀匹配，也不会把 /src2 当作 /src 的子目录
+        """
+        dir_path = self.normalize_dir_path(folder_path)
+        prefix = dir_path if dir_path.endswith(os.sep) else dir_path + os.sep
+        # 以 prefix 开头的字符串都不小于 prefix，且小于把最后一个字符（分隔符）加一后的字符串
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return (f"{column} IN (SELECT id FROM directories WHERE path = ? OR (path >= ? AND path < ?))",
+                [dir_path, prefix, upper])
+
+    def bump_index_generation(self):
+        """索引内容已变化：索引代数加一（随当前事务提交）"""
+        self.cursor.execute("""
+            INSERT INTO index_meta (key, value) VALUES ('generation', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+        """)
+
+    def get_index_version(self, conn):
+        """返回索引版本 "数据库 id:索引代数"，用作结果缓存键的最后一项"""
+        meta = dict(conn.execute("SELECT key, value FROM index_meta WHERE key IN ('db_id', 'generation')"))
+        return f"{meta.get('db_id', 0)}:{meta.get('generation', 0)}"
+
+    def get_result_cache(self):
+        """按当前配置创建（或复用）搜索结果缓存，未启用时返回 None"""
+        if not self.result_cache_size:
+            return None
+        if self.result_cache is None:
+            self.result_cache = QueryResultCache(self.result_cache_size, self.result_cache_path)
+        return self.result_cache
+
     def clear_index(self):
-        if self.conn:
-            self.cursor.execute("DELETE FROM files")
-            self.cursor.execute("DELETE FROM file_contents")
-            self.conn.commit()
-            self.indexing_progress.emit("旧索引已清除。")
+        # 单独调用（如界面上的清空索引）时自行打开和关闭连接
+        standalone = self.conn is None
+        if standalone and not self.connect_db():
+            return
+        # 整表清空时不逐行触发统计更新，直接清空统计
+        self.drop_stats_triggers()
+        self.cursor.execute("DELETE FROM files")
+        self.cursor.execute("DELETE FROM directories")
+        self.cursor.execute("DELETE FROM file_stats")
+        self.cursor.execute("DELETE FROM index_meta WHERE key = 'last_indexed'")
+        self.create_stats_triggers()
+        self.dir_id_cache = {}
+        self.content_seq = {}
+        # 直接删除并重建内容表，比逐行删除快得多，同时应用当前的存储布局和三元组索引设置
+        for table in ('file_contents', 'file_chunks', 'file_trigrams', 'content_trigrams'):
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        self.create_content_tables({})
+        self.bump_index_generation()
+        self.conn.commit()
+        self.store_schema_state()
+        self.report_progress("旧索引已清除。")
+        if standalone:
+            self.conn.close()
+            self.conn = None
+            self.cursor = None
+            self.report_finished(0)
+
+    def new_file_hasher(self):
+        """按配置创建哈希对象，返回 (算法名, 哈希对象)，未知算法退回 blake2b"""
+        algorithm = self.hash_algorithm if self.hash_algorithm in HASH_ALGORITHMS else 'blake2b'
+        return algorithm, HASH_ALGORITHMS[algorithm]()
 
-    def calculate_file_hash(self, file_path, chunk_size=8192):
-        """计算文件的MD5哈希值"""
-        md5_hash = hashlib.md5()
+    def calculate_file_hash(self, file_path, chunk_size=1024 * 1024):
+        """计算整个文件的哈希值，结果带算法名前缀（如 blake2b:...），切换算法后旧哈希不会误判为相同"""
+        algorithm, file_hash = self.new_file_hasher()
         try:
             with open(file_path, "rb") as f:
                 while chunk := f.read(chunk_size):
-                    md5_hash.update(chunk)
-                    # 对于大文件，只读取前1MB来计算哈希
-                    if f.tell() >= 1024 * 1024:
-                        break
-            return md5_hash.hexdigest()
+                    file_hash.update(chunk)
+            return f"{algorithm}:{file_hash.hexdigest()}"
         except Exception:
             return None
 
+    def scan_directory(self, dir_path):
+        """扫描单个目录，返回 (文件 DirEntry 列表, 子目录路径列表)，文件的 stat 结果缓存在 DirEntry 中"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self.should_skip_directory(entry.name):
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            # 在扫描线程中预取 stat，后续的跳过/索引判断直接复用
+                            self.get_entry_stat(entry)
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files, subdirs
+
+    def walk_files(self, folder_path):
+        """基于 os.scandir 遍历文件夹，按目录生成 (目录路径, 文件 DirEntry 列表)"""
+        if self.scan_threads > 1:
+            yield from self._walk_files_parallel(folder_path)
+            return
+
+        stack = [folder_path]
+        while stack:
+            dir_path = stack.pop()
+            files, subdirs = self.scan_directory(dir_path)
+            yield dir_path, files
+            # 逆序入栈，保持与 os.walk 相同的遍历顺序
+            stack.extend(reversed(subdirs))
+
+    def _walk_files_parallel(self, folder_path):
+        """多线程并发扫描目录，适用于高延迟的网络文件系统"""
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        with ThreadPoolExecutor(max_workers=self.scan_threads) as executor:
+            pending = {executor.submit(self.scan_directory, folder_path): folder_path}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path = pending.pop(future)
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        pending[executor.submit(self.scan_directory, subdir)] = subdir
+                    yield dir_path, files
+
+    def get_entry_stat(self, entry):
+        """获取 DirEntry 的 stat 结果（已缓存），失败时返回 None"""
+        try:
+            return entry.stat()
+        except OSError:
+            return None
+
+    def is_stat_unchanged(self, existing_info, file_stat):
+        """根据索引中记录的 (大小, 修改时间, inode) 判断文件是否未变化"""
+        if existing_info['mtime_ns'] is None:
+            # 旧版本索引没有记录 stat 信息
+            return False
+        return (existing_info['size'] == file_stat.st_size and
+                existing_info['mtime_ns'] == file_stat.st_mtime_ns and
+                existing_info['inode'] == file_stat.st_ino)
+
     def should_skip_directory(self, dir_name):
         """检查是否应该跳过该目录"""
         # 检查是否是隐藏目录（除了某些特殊情况）
@@ -293,8 +1270,8 @@ class FileIndexer(QObject):
         
         return False
 
-    def should_index_file(self, file_path):
-        """判断是否应该索引该文件"""
+    def should_index_file(self, file_path, file_stat=None):
+        """判断是否应该索引该文件（file_stat 为遍历时已获取的 stat 结果，可省去一次系统调用）"""
         file_name = os.path.basename(file_path)
         
         # 跳过隐藏文件
@@ -303,8 +1280,8 @@ class FileIndexer(QObject):
         
         # 检查文件大小
         try:
-            file_size = os.path.getsize(file_path)
-            if file_size > self.max_file_size:
+            file_size = file_stat.st_size if file_stat else os.path.getsize(file_path)
+            if file_size > self.max_file_size and not self.large_file_mode:
                 return False, file_size, "too_large"
             if file_size == 0:
                 return False, 0, "empty"
@@ -336,187 +1313,377 @@ class FileIndexer(QObject):
         
         return False, file_size, "unknown"
 
-    def index_file(self, file_path, file_id=None):
-        """索引单个文件的内容"""
+    def read_file_for_index(self, file_path, file_stat=None):
+        """读取文件信息和内容，返回待写入数据库的记录（不访问数据库，可在工作线程中调用）"""
+        if file_stat is None:
+            file_stat = os.stat(file_path)
+
+        # 优先用 mmap 映射文件：哈希、二进制检测和分行都在同一份映射上完成，文件只读一次
         try:
-            # 如果有旧的file_id，先删除旧内容
-            if file_id:
-                self.cursor.execute("DELETE FROM file_contents WHERE file_id = ?", (file_id,))
-            
-            # 获取文件信息
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            _, ext = os.path.splitext(file_path.lower())
-            modified_time = os.path.getmtime(file_path)
+            with open(file_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # 空文件或不支持映射的文件系统，退回普通读取
+            mapped = None
+
+        if mapped is not None:
+            if mapped.find(b'\0', 0, self.binary_sniff_size) != -1:
+                mapped.close()
+                file_hash, lines, binary = None, iter(()), True
+            else:
+                # 哈希覆盖整个文件；页面随之读入缓存，随后的分行不会再产生磁盘读取
+                algorithm, hasher = self.new_file_hasher()
+                with memoryview(mapped) as view:
+                    hasher.update(view)
+                file_hash = f"{algorithm}:{hasher.hexdigest()}"
+                lines, binary = self.iter_mapped_lines(mapped), False
+        else:
             file_hash = self.calculate_file_hash(file_path)
-            
             if not file_hash:
                 return None
-            
+            lines, binary = self.iter_file_lines(file_path), False
+
+        _, ext = os.path.splitext(file_path.lower())
+        record = {
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'file_size': file_stat.st_size,
+            'file_ext': ext,
+            'file_hash': file_hash,
+            'modified_time': file_stat.st_mtime,
+            'mtime_ns': file_stat.st_mtime_ns,
+            'inode': file_stat.st_ino,
+            'binary': binary,
+            # 内容按需逐行读取，调用方分批消费
+            'lines': lines
+        }
+        return record
+
+    def iter_mapped_lines(self, mapped):
+        """在 mmap 上按字节分行，生成 (行号, 文本)，只解码需要保留的行"""
+        try:
+            if self.large_file_mode:
+                yield from self._iter_large_mapped_lines(mapped)
+                return
+
+            max_length = self.max_line_length
+            # UTF-8 每个字符最多 4 字节，超过这个字节数的行一定过长，不必解码
+            max_bytes = max_length * 4
+            for line_num, raw in enumerate(iter(mapped.readline, b''), 1):
+                if len(raw) < max_bytes and not raw.isspace():
+                    line = raw.decode('utf-8', 'ignore').strip()
+                    # 跳过空行和过长的行
+                    if line and len(line) < max_length:
+                        yield line_num, line
+
+                # 防止大文件占用过多内存
+                if line_num > 10000:
+                    break
+        finally:
+            mapped.close()
+
+    def _iter_large_mapped_lines(self, mapped):
+        """大文件模式（mmap）：超长行按固定字节数切分为多段（行号相同），读满字节预算后停止"""
+        max_length = self.max_line_length
+        size = len(mapped)
+        if self.file_byte_budget:
+            size = min(size, self.file_byte_budget)
+        line_num = 1
+        pos = 0
+        with memoryview(mapped) as view:
+            while pos < size:
+                end = mapped.find(b'\n', pos)
+                if end == -1:
+                    end = len(mapped)
+
+                start = pos
+                while start < end and start < size:
+                    stop = min(start + max_length, end)
+                    if stop < end:
+                        # 尽量在空白处切分，否则退到 UTF-8 字符边界，避免切坏多字节字符
+                        cut = mapped.rfind(b' ', start + max_length // 2, stop)
+                        if cut > 0:
+                            stop = cut
+                        else:
+                            while stop > start + 1 and (mapped[stop] & 0xC0) == 0x80:
+                                stop -= 1
+                    text = str(view[start:stop], 'utf-8', 'ignore').strip()
+                    if text:
+                        yield line_num, text
+                    start = stop
+
+                line_num += 1
+                pos = end + 1
+
+    def iter_file_lines(self, file_path):
+        """逐行读取文件内容，生成 (行号, 文本)，跳过空行"""
+        if self.large_file_mode:
+            yield from self._iter_large_file_lines(file_path)
+            return
+
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                # 跳过空行和过长的行
+                if line and len(line) < self.max_line_length:
+                    yield line_num, line
+
+                # 防止大文件占用过多内存
+                if line_num > 10000:
+                    break
+
+    def _iter_large_file_lines(self, file_path):
+        """大文件模式：按固定长度读取，超长行切分为多段（行号相同），读满字节预算后停止"""
+        consumed = 0
+        line_num = 1
+        carry = ''
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            while True:
+                # 限制单次读取长度，即使整个文件只有一行也不会一次读入内存
+                piece = f.readline(self.max_line_length - len(carry))
+                consumed += len(piece)
+                segment = carry + piece
+                carry = ''
+                if not segment:
+                    break
+
+                ended = segment.endswith('\n') or not piece
+                if not ended:
+                    # 尽量在空白处切分，避免把一个词切成两半导致搜不到
+                    cut = segment.rfind(' ', self.max_line_length // 2)
+                    if cut > 0:
+                        segment, carry = segment[:cut], segment[cut:]
+
+                text = segment.strip()
+                if text:
+                    yield line_num, text
+                if ended:
+                    line_num += 1
+
+                if self.file_byte_budget and consumed >= self.file_byte_budget:
+                    break
+
+    def index_file(self, file_path, file_id=None, file_stat=None, record=None):
+        """索引单个文件的内容，二进制文件返回 False"""
+        try:
+            # 如果有旧的file_id，先删除旧内容
+            if file_id:
+                self.delete_file_contents(file_id)
+
+            if record is None:
+                record = self.read_file_for_index(file_path, file_stat)
+            if not record:
+                return None
+            if record['binary']:
+                # 内容已变成二进制的文件从索引中移除
+                if file_id:
+                    self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                return False
+
             # 插入或更新文件记录
             if file_id:
                 self.cursor.execute("""
                     UPDATE files 
                     SET file_name = ?, file_size = ?, file_ext = ?, 
-                        file_hash = ?, modified_time = ?, indexed_at = CURRENT_TIMESTAMP
+                        file_hash = ?, modified_time = ?, mtime_ns = ?, inode = ?,
+                        indexed_at = CURRENT_TIMESTAMP
                     WHERE id = ?
-                """, (file_name, file_size, ext, file_hash, modified_time, file_id))
+                """, (record['file_name'], record['file_size'], record['file_ext'],
+                      record['file_hash'], record['modified_time'], record['mtime_ns'],
+                      record['inode'], file_id))
             else:
+                dir_id = self.get_dir_id(os.path.dirname(file_path))
                 self.cursor.execute("""
-                    INSERT INTO files (file_path, file_name, file_size, file_ext, file_hash, modified_time)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (file_path, file_name, file_size, ext, file_hash, modified_time))
+                    INSERT INTO files (file_path, file_name, file_size, file_ext, file_hash,
+                                       modified_time, mtime_ns, inode, dir_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (file_path, record['file_name'], record['file_size'], record['file_ext'],
+                      record['file_hash'], record['modified_time'], record['mtime_ns'],
+                      record['inode'], dir_id))
                 file_id = self.cursor.lastrowid
-            
-            # 读取并索引文件内容
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                batch_data = []
-                
-                for line_num, line in enumerate(f, 1):
-                    line = line.strip()
-                    # 跳过空行和过长的行
-                    if line and len(line) < 1000:
-                        batch_data.append((file_id, line_num, line))
-                        
-                        # 批量插入以提高性能
-                        if len(batch_data) >= 1000:
-                            self.cursor.executemany(
-                                "INSERT INTO file_contents (file_id, line_number, content) VALUES (?, ?, ?)",
-                                batch_data
-                            )
-                            batch_data = []
-                    
-                    # 防止大文件占用过多内存
-                    if line_num > 10000:
-                        break
-                
-                # 插入剩余的数据
-                if batch_data:
-                    self.cursor.executemany(
-                        "INSERT INTO file_contents (file_id, line_number, content) VALUES (?, ?, ?)",
-                        batch_data
-                    )
-            
+
+            # 分批读取并插入，大文件也只占用有限的内存
+            lines = record['lines']
+            while True:
+                window = [(file_id, line_num, line) for line_num, line in islice(lines, self.read_window_lines)]
+                if not window:
+                    break
+                self.insert_content_rows(window)
+
             return file_id
             
         except Exception as e:
-            self.indexing_error.emit(f"索引文件失败 {file_path}: {str(e)}")
+            if is_database_locked(e):
+                raise
+            self.report_error(f"索引文件失败 {file_path}: {str(e)}")
             return None
 
-    def update_index(self, folder_path):
-        """增量更新索引"""
-        if not self.connect_db():
-            return
-
-        stats = {
+    def new_update_stats(self):
+        return {
             'new': 0,
             'updated': 0,
             'deleted': 0,
             'unchanged': 0,
             'skipped': 0,
             'errors': 0,
-            'total_size': 0
+            'total_size': 0,
+            # 已提交的变化文件数（新增 + 更新 + 删除）
+            'committed': 0
         }
-        
-        # 获取当前索引中的所有文件
-        self.cursor.execute("SELECT id, file_path, file_hash, modified_time FROM files WHERE file_path LIKE ?", 
-                           (f"{folder_path}%",))
-        existing_files = {row[1]: {'id': row[0], 'hash': row[2], 'mtime': row[3]} 
-                         for row in self.cursor.fetchall()}
-        
+
+    def commit_update_batch(self, stats):
+        """提交当前事务；自上次提交以来有文件变化时索引代数随同一事务加一，中途失败也不会留下过期的缓存结果"""
+        changed = stats['new'] + stats['updated'] + stats['deleted']
+        if changed != stats['committed']:
+            self.bump_index_generation()
+            stats['committed'] = changed
+        self.conn.commit()
+
+    def format_update_stats(self, stats):
+        return (f"新增 {stats['new']} 个，更新 {stats['updated']} 个，"
+                f"删除 {stats['deleted']} 个，未变化 {stats['unchanged']} 个，"
+                f"跳过 {stats['skipped']} 个，错误 {stats['errors']} 个")
+
+    @staticmethod
+    def existing_file_info(row):
+        """把 (id, file_path, file_hash, modified_time, file_size, mtime_ns, inode) 记录转成比较用的字典"""
+        return {'id': row[0], 'hash': row[2], 'mtime': row[3],
+                'size': row[4], 'mtime_ns': row[5], 'inode': row[6]}
+
+    def update_file(self, file_path, file_stat, existing_info, stats):
+        """检查单个文件：新文件加入索引，内容变化的文件重新索引（existing_info 为索引中的记录，新文件为 None）"""
+        file_name = os.path.basename(file_path)
+
+        # 检查是否应该索引该文件
+        should_index, file_size, reason = self.should_index_file(file_path, file_stat)
+
+        if not should_index:
+            stats['skipped'] += 1
+            return
+
+        try:
+            # 检查文件是否已存在于索引中
+            if existing_info is not None:
+                # 快速路径：(大小, 修改时间, inode) 均未变化时不再读取文件
+                if not self.paranoid_check and self.is_stat_unchanged(existing_info, file_stat):
+                    stats['unchanged'] += 1
+                    return
+
+                # 读取文件（哈希在读取时一并算出，内容变化时直接复用这次读取）
+                record = self.read_file_for_index(file_path, file_stat)
+                modified_time = file_stat.st_mtime
+
+                if not record:
+                    stats['errors'] += 1
+                    return
+
+                # 比较哈希值和修改时间
+                if (not record['binary'] and existing_info['hash'] == record['file_hash'] and
+                    abs(existing_info['mtime'] - modified_time) < 1):
+                    # 文件未变化，记录最新的 stat 信息以便下次走快速路径
+                    self.cursor.execute("""
+                        UPDATE files SET file_size = ?, mtime_ns = ?, inode = ?
+                        WHERE id = ?
+                    """, (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino,
+                          existing_info['id']))
+                    stats['unchanged'] += 1
+                    self.report_progress(f"未变化: {file_name}")
+                else:
+                    # 文件已变化，需要更新
+                    result = self.index_file(file_path, existing_info['id'], file_stat, record)
+                    if result:
+                        stats['updated'] += 1
+                        stats['total_size'] += file_size
+                        self.report_progress(f"已更新: {file_name}")
+                    elif result is False:
+                        # 内容变成了二进制，已从索引中移除
+                        stats['deleted'] += 1
+                    else:
+                        stats['errors'] += 1
+            else:
+                # 新文件
+                result = self.index_file(file_path, file_stat=file_stat)
+                if result:
+                    stats['new'] += 1
+                    stats['total_size'] += file_size
+                    self.report_progress(f"新文件: {file_name}")
+                elif result is False:
+                    stats['skipped'] += 1
+                else:
+                    stats['errors'] += 1
+
+            # 每100个变化的文件提交一次
+            if stats['new'] + stats['updated'] + stats['deleted'] - stats['committed'] >= 100:
+                self.commit_update_batch(stats)
+                self.conn.execute("BEGIN TRANSACTION")
+
+        except Exception as e:
+            if is_database_locked(e):
+                # 不是这个文件的问题：交给调用方回滚整批，稍后重试
+                raise
+            stats['errors'] += 1
+            self.report_error(f"处理文件失败 {file_name}: {str(e)}")
+
+    def remove_file(self, file_id, file_path, stats):
+        """从索引中删除已不存在的文件"""
+        self.delete_file_contents(file_id)
+        self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        stats['deleted'] += 1
+        self.report_progress(f"已删除: {os.path.basename(file_path)}")
+
+    def update_folder_files(self, folder_path, stats):
+        """对比文件夹下的文件和索引中的记录：加入新文件、更新变化的文件、删除已不存在的文件"""
+        # 获取当前索引中该文件夹下的所有文件
+        folder_filter, folder_params = self.build_folder_filter(folder_path, "dir_id")
+        self.cursor.execute(f"""
+            SELECT id, file_path, file_hash, modified_time, file_size, mtime_ns, inode
+            FROM files WHERE {folder_filter}
+        """, folder_params)
+        existing_files = {row[1]: self.existing_file_info(row) for row in self.cursor.fetchall()}
+
         # 用于跟踪处理过的文件
         processed_files = set()
-        
+
+        for root, entries in self.walk_files(folder_path):
+            # 显示当前处理的目录
+            rel_path = os.path.relpath(root, folder_path)
+            if rel_path != '.':
+                self.report_progress(f"扫描目录: {rel_path}")
+
+            for entry in entries:
+                processed_files.add(entry.path)
+                self.update_file(entry.path, self.get_entry_stat(entry), existing_files.get(entry.path), stats)
+
+        # 删除不存在的文件
+        for file_path, file_info in existing_files.items():
+            if file_path not in processed_files:
+                self.remove_file(file_info['id'], file_path, stats)
+
+    def update_index(self, folder_path):
+        """增量更新索引"""
+        if not self.connect_db():
+            return
+
+        stats = self.new_update_stats()
+
         # 开始事务
         self.conn.execute("BEGIN TRANSACTION")
         
         try:
-            for root, dirs, files in os.walk(folder_path):
-                # 过滤掉不需要的目录
-                dirs[:] = [d for d in dirs if not self.should_skip_directory(d)]
-                
-                # 显示当前处理的目录
-                rel_path = os.path.relpath(root, folder_path)
-                if rel_path != '.':
-                    self.indexing_progress.emit(f"扫描目录: {rel_path}")
-                
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    processed_files.add(file_path)
-                    
-                    # 检查是否应该索引该文件
-                    should_index, file_size, reason = self.should_index_file(file_path)
-                    
-                    if not should_index:
-                        stats['skipped'] += 1
-                        continue
-                    
-                    try:
-                        # 计算文件哈希和修改时间
-                        file_hash = self.calculate_file_hash(file_path)
-                        modified_time = os.path.getmtime(file_path)
-                        
-                        if not file_hash:
-                            stats['errors'] += 1
-                            continue
-                        
-                        # 检查文件是否已存在于索引中
-                        if file_path in existing_files:
-                            existing_info = existing_files[file_path]
-                            
-                            # 比较哈希值和修改时间
-                            if (existing_info['hash'] == file_hash and 
-                                abs(existing_info['mtime'] - modified_time) < 1):
-                                # 文件未变化
-                                stats['unchanged'] += 1
-                                self.indexing_progress.emit(f"未变化: {file_name}")
-                            else:
-                                # 文件已变化，需要更新
-                                if self.index_file(file_path, existing_info['id']):
-                                    stats['updated'] += 1
-                                    stats['total_size'] += file_size
-                                    self.indexing_progress.emit(f"已更新: {file_name}")
-                                else:
-                                    stats['errors'] += 1
-                        else:
-                            # 新文件
-                            if self.index_file(file_path):
-                                stats['new'] += 1
-                                stats['total_size'] += file_size
-                                self.indexing_progress.emit(f"新文件: {file_name}")
-                            else:
-                                stats['errors'] += 1
-                        
-                        # 每100个文件提交一次
-                        if (stats['new'] + stats['updated']) % 100 == 0:
-                            self.conn.commit()
-                            self.conn.execute("BEGIN TRANSACTION")
-                            
-                    except Exception as e:
-                        stats['errors'] += 1
-                        self.indexing_error.emit(f"处理文件失败 {file_name}: {str(e)}")
-            
-            # 删除不存在的文件
-            for file_path, file_info in existing_files.items():
-                if file_path not in processed_files:
-                    # 文件已被删除
-                    self.cursor.execute("DELETE FROM file_contents WHERE file_id = ?", (file_info['id'],))
-                    self.cursor.execute("DELETE FROM files WHERE id = ?", (file_info['id'],))
-                    stats['deleted'] += 1
-                    self.indexing_progress.emit(f"已删除: {os.path.basename(file_path)}")
-            
+            self.update_folder_files(folder_path, stats)
+
             # 提交最终事务
-            self.conn.commit()
+            self.commit_update_batch(stats)
             
             # 优化数据库（仅在有较大变化时）
             if stats['new'] + stats['updated'] + stats['deleted'] > 100:
-                self.indexing_progress.emit("正在优化数据库...")
+                self.report_progress("正在优化数据库...")
                 self.cursor.execute("VACUUM")
                 self.cursor.execute("ANALYZE")
             
         except Exception as e:
             self.conn.rollback()
-            self.indexing_error.emit(f"更新索引过程出错: {str(e)}")
+            self.report_error(f"更新索引过程出错: {str(e)}")
         finally:
             if self.conn:
                 self.conn.close()
@@ -525,12 +1692,73 @@ class FileIndexer(QObject):
         
         # 生成统计信息
         total_processed = stats['new'] + stats['updated'] + stats['unchanged']
-        self.indexing_progress.emit(
-            f"更新完成：新增 {stats['new']} 个，更新 {stats['updated']} 个，"
-            f"删除 {stats['deleted']} 个，未变化 {stats['unchanged']} 个，"
-            f"跳过 {stats['skipped']} 个，错误 {stats['errors']} 个"
-        )
-        self.indexing_finished.emit(total_processed)
+        self.report_progress(f"更新完成：{self.format_update_stats(stats)}")
+        self.report_finished(total_processed)
+
+    def update_paths(self, paths):
+        """只重新检查给定的路径（监视到变化的文件或目录），返回统计信息，失败时返回 None
+
+        存在的目录按 update_index 的方式对比其下的全部文件，存在的文件单独检查，
+        已不存在的路径连同以它为目录的文件一起从索引中删除
+        """
+        paths = set(paths)
+
+        def covered(path):
+            # 祖先目录也在这一批中时，检查祖先目录时已包含该路径
+            parent = os.path.dirname(path)
+            while parent and parent != path:
+                if parent in paths:
+                    return True
+                path, parent = parent, os.path.dirname(parent)
+            return False
+
+        targets = sorted(path for path in paths if not covered(path))
+        if not self.connect_db():
+            return None
+
+        stats = self.new_update_stats()
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            for path in targets:
+                if os.path.isdir(path):
+                    self.update_folder_files(path, stats)
+                    continue
+
+                self.cursor.execute("""
+                    SELECT id, file_path, file_hash, modified_time, file_size, mtime_ns, inode
+                    FROM files WHERE file_path = ?
+                """, (path,))
+                row = self.cursor.fetchone()
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    file_stat = None
+
+                if file_stat is not None:
+                    self.update_file(path, file_stat, row and self.existing_file_info(row), stats)
+                else:
+                    # 文件或目录已被删除（或移走）
+                    folder_filter, folder_params = self.build_folder_filter(path, "dir_id")
+                    self.cursor.execute(f"SELECT id, file_path FROM files WHERE file_path = ? OR {folder_filter}",
+                                        [path] + folder_params)
+                    for file_id, file_path in self.cursor.fetchall():
+                        self.remove_file(file_id, file_path, stats)
+
+            self.commit_update_batch(stats)
+            return stats
+
+        except Exception as e:
+            self.conn.rollback()
+            if is_database_locked(e):
+                self.report_progress(f"数据库正被其他操作占用，稍后重试: {str(e)}")
+            else:
+                self.report_error(f"更新索引过程出错: {str(e)}")
+            return None
+        finally:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+                self.cursor = None
 
     def index_folder(self, folder_path):
         """创建新索引（清空旧索引）"""
@@ -547,64 +1775,59 @@ class FileIndexer(QObject):
             'skip_reasons': {}
         }
         
+        start_time = time.monotonic()
+
         # 开始事务
         self.conn.execute("BEGIN TRANSACTION")
         
         try:
-            for root, dirs, files in os.walk(folder_path):
-                # 过滤掉不需要的目录
-                dirs[:] = [d for d in dirs if not self.should_skip_directory(d)]
-                
-                # 显示当前处理的目录
-                rel_path = os.path.relpath(root, folder_path)
-                if rel_path != '.':
-                    self.indexing_progress.emit(f"扫描目录: {rel_path}")
-                
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    
-                    # 检查是否应该索引该文件
-                    should_index, file_size, reason = self.should_index_file(file_path)
-                    
-                    if not should_index:
-                        stats['skipped'] += 1
-                        stats['skip_reasons'][reason] = stats['skip_reasons'].get(reason, 0) + 1
-                        continue
-                    
+            if self.index_workers > 0:
+                self._index_folder_parallel(folder_path, stats, start_time)
+            else:
+                for file_path, file_stat in self._iter_index_candidates(folder_path, stats):
+                    file_name = os.path.basename(file_path)
                     try:
-                        if self.index_file(file_path):
+                        result = self.index_file(file_path, file_stat=file_stat)
+                        if result:
                             stats['indexed'] += 1
-                            stats['total_size'] += file_size
-                            self.indexing_progress.emit(f"已索引: {file_name}")
+                            stats['total_size'] += file_stat.st_size
+                            self.report_progress(f"已索引: {file_name}")
+                            # 每100个文件提交一次（连同索引代数）；跳过或出错的文件不改变计数，不会重复提交
+                            if stats['indexed'] % 100 == 0:
+                                self.bump_index_generation()
+                                self.conn.commit()
+                                self.conn.execute("BEGIN TRANSACTION")
+                        elif result is False:
+                            stats['skipped'] += 1
+                            stats['skip_reasons']['binary'] = stats['skip_reasons'].get('binary', 0) + 1
                         else:
                             stats['errors'] += 1
-                        
-                        # 每100个文件提交一次
-                        if stats['indexed'] % 100 == 0:
-                            self.conn.commit()
-                            self.conn.execute("BEGIN TRANSACTION")
                             
                     except Exception as e:
                         stats['errors'] += 1
-                        self.indexing_error.emit(f"索引文件失败 {file_name}: {str(e)}")
+                        self.report_error(f"索引文件失败 {file_name}: {str(e)}")
             
+            self.bump_index_generation()
+
             # 提交最终事务
             self.conn.commit()
             
             # 优化数据库
-            self.indexing_progress.emit("正在优化数据库...")
+            self.report_progress("正在优化数据库...")
             self.cursor.execute("VACUUM")
             self.cursor.execute("ANALYZE")
             
         except Exception as e:
             self.conn.rollback()
-            self.indexing_error.emit(f"索引过程出错: {str(e)}")
+            self.report_error(f"索引过程出错: {str(e)}")
         finally:
             if self.conn:
                 self.conn.close()
                 self.conn = None
                 self.cursor = None
         
+        elapsed = time.monotonic() - start_time
+
         # 获取数据库文件大小
         db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
         
@@ -616,108 +1839,713 @@ class FileIndexer(QObject):
                 'too_large': '文件过大',
                 'empty': '空文件',
                 'skip_ext': '二进制/媒体文件',
+                'binary': '二进制内容',
                 'unknown': '未知类型',
                 'error': '读取错误'
             }.get(reason, reason)
             skip_info.append(f"{reason_text}: {count}")
         
-        self.indexing_progress.emit(
+        self.report_progress(
             f"索引完成：已索引 {stats['indexed']} 个文件，"
             f"跳过 {stats['skipped']} 个文件 ({', '.join(skip_info)})，"
             f"错误 {stats['errors']} 个，"
             f"总大小 {self.format_size(stats['total_size'])}，"
-            f"索引大小 {self.format_size(db_size)}"
+            f"索引大小 {self.format_size(db_size)}，"
+            f"耗时 {elapsed:.1f} 秒（{self.format_throughput(stats['indexed'], stats['total_size'], elapsed)}）"
         )
-        self.indexing_finished.emit(stats['indexed'])
+        self.report_finished(stats['indexed'])
 
-    def search_content(self, keyword, folder_path=None, use_regex=False):
-        if not self.connect_db():
-            return []
+    def _iter_index_candidates(self, folder_path, stats):
+        """遍历文件夹，生成需要索引的 (文件路径, stat 结果)，并统计跳过的文件"""
+        for root, entries in self.walk_files(folder_path):
+            # 显示当前处理的目录
+            rel_path = os.path.relpath(root, folder_path)
+            if rel_path != '.':
+                self.report_progress(f"扫描目录: {rel_path}")
+            
+            for entry in entries:
+                # 检查是否应该索引该文件
+                file_stat = self.get_entry_stat(entry)
+                if file_stat is None:
+                    should_index, reason = False, "error"
+                else:
+                    should_index, file_size, reason = self.should_index_file(entry.path, file_stat)
+                
+                if not should_index:
+                    stats['skipped'] += 1
+                    stats['skip_reasons'][reason] = stats['skip_reasons'].get(reason, 0) + 1
+                    continue
+                
+                yield entry.path, file_stat
+
+    def _index_folder_parallel(self, folder_path, stats, start_time):
+        """并行索引流水线：目录遍历线程 -> 多个读取/哈希工作线程 -> 当前线程作为唯一的数据库写入者"""
+        worker_count = self.index_workers
+        path_queue = queue.Queue(maxsize=worker_count * 64)
+        record_queue = queue.Queue(maxsize=worker_count * 16)
+        stop_event = threading.Event()
+        # 遍历线程统计的跳过文件单独计数，线程结束后再合并，避免与写入线程同时修改 stats
+        walk_stats = {'skipped': 0, 'skip_reasons': {}}
+
+        def put(q, item):
+            # 写入线程出错时停止阻塞，让各线程尽快退出
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def walker():
+            try:
+                for candidate in self._iter_index_candidates(folder_path, walk_stats):
+                    if not put(path_queue, candidate):
+                        return
+            finally:
+                for _ in range(worker_count):
+                    put(path_queue, None)
+
+        def read_file(file_path, file_size, file_stat):
+            # 文件内容按窗口分多条消息发送，第一条携带文件信息，最后一条标记 last
+            try:
+                record = self.read_file_for_index(file_path, file_stat)
+            except Exception as e:
+                return put(record_queue, (file_path, file_size, None, [], True, str(e)))
+            if not record:
+                return put(record_queue, (file_path, file_size, None, [], True, None))
+
+            lines = record.pop('lines')
+            first = True
+            while True:
+                try:
+                    window = list(islice(lines, self.read_window_lines))
+                except Exception as e:
+                    return put(record_queue, (file_path, file_size, None, [], True, str(e)))
+                last = len(window) < self.read_window_lines
+                if not put(record_queue, (file_path, file_size, record if first else None, window, last, None)):
+                    return False
+                first = False
+                if last:
+                    return True
+
+        def reader():
+            try:
+                while True:
+                    # 写入线程出错后遍历线程不再发送结束标记，需要定期检查是否应当退出
+                    try:
+                        candidate = path_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        if stop_event.is_set():
+                            return
+                        continue
+                    if candidate is None:
+                        return
+                    file_path, file_stat = candidate
+                    if not read_file(file_path, file_stat.st_size, file_stat):
+                        return
+            finally:
+                put(record_queue, None)
+
+        threads = [threading.Thread(target=walker, name="index-walker", daemon=True)]
+        threads += [threading.Thread(target=reader, name=f"index-reader-{i}", daemon=True)
+                    for i in range(worker_count)]
+        for thread in threads:
+            thread.start()
+
+        # 写入线程自行分配 file_id，这样文件记录和内容都可以用 executemany 批量写入
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM files")
+        next_file_id = self.cursor.fetchone()[0] + 1
+        file_rows = []
+        content_rows = []
+        last_report = start_time
+
+        def flush():
+            if file_rows:
+                self.cursor.executemany("""
+                    INSERT INTO files (id, file_path, file_name, file_size, file_ext, file_hash,
+                                       modified_time, mtime_ns, inode, dir_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, file_rows)
+            if content_rows:
+                self.insert_content_rows(content_rows)
+            file_rows.clear()
+            content_rows.clear()
+            self.bump_index_generation()
+            self.conn.commit()
+            self.conn.execute("BEGIN TRANSACTION")
+
+        # 正在分窗口接收内容的文件：路径 -> file_id
+        open_files = {}
 
+        try:
+            finished_workers = 0
+            while finished_workers < worker_count:
+                item = record_queue.get()
+                if item is None:
+                    finished_workers += 1
+                    continue
+
+                file_path, file_size, record, lines, last, error = item
+                if record and record['binary']:
+                    stats['skipped'] += 1
+                    stats['skip_reasons']['binary'] = stats['skip_reasons'].get('binary', 0) + 1
+                    continue
+                if record:
+                    file_id = next_file_id
+                    next_file_id += 1
+                    file_rows.append((file_id, file_path, record['file_name'], record['file_size'],
+                                      record['file_ext'], record['file_hash'], record['modified_time'],
+                                      record['mtime_ns'], record['inode'],
+                                      self.get_dir_id(os.path.dirname(file_path))))
+                    stats['indexed'] += 1
+                    stats['total_size'] += file_size
+                    open_files[file_path] = file_id
+                else:
+                    file_id = open_files.get(file_path)
+                    if file_id is None:
+                        stats['errors'] += 1
+                if error:
+                    self.report_error(f"索引文件失败 {os.path.basename(file_path)}: {error}")
+                if last:
+                    open_files.pop(file_path, None)
+                if file_id is None:
+                    continue
+
+                content_rows.extend((file_id, line_num, line) for line_num, line in lines)
+
+                if len(file_rows) >= self.write_batch_size or len(content_rows) >= 50000:
+                    flush()
+
+                # 定期报告吞吐量
+                now = time.monotonic()
+                if now - last_report >= 1:
+                    last_report = now
+                    self.report_progress(
+                        f"已索引 {stats['indexed']} 个文件 "
+                        f"({self.format_throughput(stats['indexed'], stats['total_size'], now - start_time)})"
+                    )
+
+            flush()
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            stats['skipped'] += walk_stats['skipped']
+            for reason, count in walk_stats['skip_reasons'].items():
+                stats['skip_reasons'][reason] = stats['skip_reasons'].get(reason, 0) + count
+
+    def search_content(self, keyword, folder_path=None, use_regex=False, cancel_event=None, prefix=False):
         results = []
-        
+        for batch in self.iter_search_results(keyword, folder_path, use_regex,
+                                              cancel_event=cancel_event, prefix=prefix):
+            results.extend(batch)
+        return results
+
+    def build_search_query(self, keyword, folder_path=None, use_regex=False, prefix=False, word_match=False):
+        """构造搜索语句的公共部分，返回描述查询的字典
+
+        普通关键词默认按子串匹配，substring_search 为 False 或 word_match 为真（按相关度搜索）时
+        使用 FTS5 按词匹配
+
+        按块存储时查询命中的是块，需要用 line_filter 在 Python 中逐行确认匹配的行，
+        这种情况下 SQL 无法直接给出匹配行数
+        """
+        chunked = self.content_table == 'file_chunks'
+        content_column = "fc.content"
+        line_filter = None
+        strip_markers = False
+        full_scan = False
+        conditions = []
+        params = []
+
+        if use_regex:
+            # 正则表达式搜索：先用正则中必需的字面量缩小范围（三元组索引、全文索引中的完整单词、
+            # LIKE 子串），再由注册的 REGEXP 函数在查询内部验证，不匹配的行不会返回到 Python
+            pattern = compile_search_regex(keyword)
+            literals = extract_regex_literals(keyword)
+            trigram_filter = self.build_trigram_filter(literals)
+            if trigram_filter:
+                conditions.append(trigram_filter[0])
+                params.extend(trigram_filter[1])
+            tokens = [token for literal in literals for token in extract_match_tokens(literal)]
+            if self.fts_enabled and tokens:
+                conditions.append("fc.content MATCH ?")
+                params.append(' AND '.join(f'"{token}"' for token in dict.fromkeys(tokens)))
+            # LIKE 只忽略 ASCII 字母的大小写，非 ASCII 字面量交给正则判断
+            for literal in literals:
+                if literal.isascii():
+                    escaped = literal.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                    conditions.append("fc.content LIKE ? ESCAPE '\\'")
+                    params.append(f"%{escaped}%")
+            if chunked:
+                # 块内有多行，^ $ 和环视在整块上的含义与单行不同，仍逐行验证
+                line_filter = pattern.search
+            else:
+                conditions.append("fc.content REGEXP ?")
+                params.append(keyword)
+                # 没有可用的索引预过滤时需要扫描整个内容表，可以分片并行
+                full_scan = not trigram_filter and not (self.fts_enabled and tokens)
+        else:
+            if self.fts_enabled and (word_match or not self.substring_search):
+                # 使用全文搜索按词匹配（快速）
+                conditions.append("fc.content MATCH ?")
+                params.append(self.build_match_query(keyword, prefix))
+                if chunked:
+                    # 用 highlight() 标记命中的词，包含标记的行即为匹配行
+                    # （多个词的查询以块为单位要求同时出现，行内只需命中其中之一）
+                    content_column = "highlight(file_chunks, 2, char(1), char(2))"
+                    line_filter = lambda line: '\x01' in line
+                    strip_markers = True
+            else:
+                # 使用 LIKE 按子串搜索，有三元组索引时先筛选候选行
+                trigram_filter = self.build_trigram_filter([keyword])
+                if trigram_filter:
+                    conditions.append(trigram_filter[0])
+                    params.extend(trigram_filter[1])
+                conditions.append("fc.content LIKE ?")
+                params.append(f"%{keyword}%")
+                if chunked:
+                    # 与 LIKE 相同，只忽略 ASCII 字母的大小写（"É" 与 "é" 不相同）
+                    line_filter = re.compile(re.escape(keyword), re.IGNORECASE | re.ASCII).search
+
+        if folder_path:
+            folder_filter, folder_params = self.build_folder_filter(folder_path)
+            conditions.append(folder_filter)
+            params.extend(folder_params)
+
+        if chunked:
+            from_sql = "FROM file_chunks fc JOIN files f ON fc.file_id = f.id"
+        else:
+            from_sql = "FROM file_contents fc JOIN files f ON fc.file_id = f.id"
+        return {
+            'chunked': chunked,
+            'from_sql': from_sql,
+            'conditions': conditions,
+            'params': params,
+            # 结果按 (文件路径, 排序键) 排列，排序键同时是分页的键。内容行的 rowid 在文件内按行递增且唯一
+            # （行号不唯一：大文件模式下超长行的各段行号相同）
+            'order_column': "fc.rowid",
+            'line_column': "fc.line_map" if chunked else "fc.line_number",
+            'content_column': content_column,
+            'line_filter': line_filter,
+            'strip_markers': strip_markers,
+            'full_scan': full_scan,
+        }
+
+    def use_parallel_scan(self, spec):
+        return self.regex_scan_workers > 0 and spec['full_scan']
+
+    def iter_parallel_scan(self, spec, columns, conditions, params, ordered=False, limit=None,
+                           cancel_event=None, folder_path=None, start_path=None):
+        """把内容表按文件路径顺序分片交给进程池并行查询，按分片顺序逐个生成每个分片的结果行列表
+
+        每个分片是路径相邻的若干文件，分片内是若干 rowid 区间（id 连续的文件合并为一个区间），
+        因此 ordered 为真时按顺序连接各分片的结果即是按 (文件路径, 排序键) 排列的全部结果。
+        limit 限制每个分片返回的行数；folder_path、start_path 只用于跳过不可能匹配的文件。
+        每个工作进程使用自己的只读连接；调用方停止迭代（结果已够或被取消）后，
+        尚未开始的分片直接跳过，正在执行的分片通过 SQLite 进度回调中断
+        """
+        file_query = "SELECT f.id, f.file_size FROM files f"
+        file_conditions = []
+        file_params = []
+        if folder_path:
+            folder_filter, folder_params = self.build_folder_filter(folder_path)
+            file_conditions.append(folder_filter)
+            file_params.extend(folder_params)
+        if start_path is not None:
+            file_conditions.append("f.file_path >= ?")
+            file_params.append(start_path)
+        if file_conditions:
+            file_query += " WHERE " + " AND ".join(file_conditions)
+        file_query += " ORDER BY f.file_path"
+
+        # 按路径顺序和文件大小划分分片
+        shards = []
+        with self.read_connection() as conn:
+            ranges = []
+            shard_bytes = 0
+            for file_id, file_size in conn.execute(file_query, file_params):
+                low, high = file_rowid_range(file_id)
+                if ranges and ranges[-1][1] + 1 == low:
+                    ranges[-1] = (ranges[-1][0], high)
+                else:
+                    ranges.append((low, high))
+                shard_bytes += file_size or 0
+                if shard_bytes >= self.regex_scan_shard_bytes:
+                    shards.append(ranges)
+                    ranges = []
+                    shard_bytes = 0
+            if ranges:
+                shards.append(ranges)
+        if not shards:
+            return
+
+        where = " AND ".join(["fc.rowid BETWEEN ? AND ?"] + list(conditions))
+        query = f"SELECT {', '.join(columns)} {spec['from_sql']} WHERE {where}"
+        if ordered:
+            query += f" ORDER BY f.file_path, {spec['order_column']}"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+
+        pool, generation, lock = get_scan_pool(self.regex_scan_workers)
+        db_path = os.path.abspath(self.db_path)
+        with lock:
+            generation.value += 1
+            current = generation.value
+            tasks = [(db_path, current, query, ranges, list(params), limit) for ranges in shards]
+            try:
+                for rows in pool.imap(_scan_shard, tasks):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    yield rows
+            finally:
+                # 让剩余的分片失效
+                generation.value += 1
+
+    def iter_result_lines(self, spec, file_path, line_info, content):
+        """把查询到的一条记录展开为匹配的结果（按块存储时一条记录包含多行）"""
+        if spec['chunked']:
+            lines = self.iter_chunk_lines(line_info, content)
+        else:
+            lines = ((line_info, content),)
+        line_filter = spec['line_filter']
+        for line_number, line in lines:
+            if line_filter and not line_filter(line):
+                continue
+            if spec['strip_markers']:
+                line = line.replace('\x01', '').replace('\x02', '')
+            yield {
+                "file_path": file_path,
+                "line_number": line_number,
+                "line_content": line
+            }
+
+    def iter_search_results(self, keyword, folder_path=None, use_regex=False, batch_size=200,
+                            cancel_event=None, prefix=False):
+        """流式搜索：逐批生成结果（每批为结果字典列表），不必等待全部结果查询完毕
+
+        cancel_event 为 threading.Event，置位后正在执行的 SQL 会被中断，搜索静默结束；
+        prefix 为真时全文搜索的最后一个词按前缀匹配
+        """
+        if self.load_schema_state() is None:
+            return
+
+        scan = None
         try:
-            if use_regex:
-                # 正则表达式搜索（较慢）
-                import re
-                pattern = re.compile(keyword, re.IGNORECASE)
-                
-                query = """
-                    SELECT f.file_path, fc.line_number, fc.content
-                    FROM file_contents fc
-                    JOIN files f ON fc.file_id = f.id
-                """
-                params = []
-                
-                if folder_path:
-                    query += " WHERE f.file_path LIKE ?"
-                    params.append(f"{folder_path}%")
-                
-                query += " ORDER BY f.file_path, fc.line_number"
-                
-                self.cursor.execute(query, params)
-                
-                for row in self.cursor.fetchall():
-                    if pattern.search(row[2]):
-                        results.append({
-                            "file_path": row[0],
-                            "line_number": row[1],
-                            "line_content": row[2]
-                        })
-                        
-                        # 限制结果数量
-                        if len(results) >= 10000:
+            with self.read_connection() as conn:
+                if cancel_event is not None:
+                    # SQLite 每执行约 1000 条虚拟机指令回调一次，返回真值即中断当前语句
+                    conn.set_progress_handler(cancel_event.is_set, 1000)
+
+                # 相同的查询在索引未变化时直接返回缓存的结果
+                result_cache = self.get_result_cache()
+                if result_cache is not None:
+                    cache_key = (keyword, folder_path, use_regex, prefix, self.max_search_results,
+                                 self.get_index_version(conn))
+                    cached = result_cache.get(cache_key)
+                    if cached is not None:
+                        for start in range(0, len(cached), batch_size):
+                            yield cached[start:start + batch_size]
+                        return
+                    collected = []
+
+                # 限制结果数量
+                limit = self.max_search_results
+
+                cursor = conn.cursor()
+                spec = self.build_search_query(keyword, folder_path, use_regex, prefix)
+                columns = ["f.file_path", spec['line_column'], spec['content_column']]
+                if self.use_parallel_scan(spec):
+                    # 分片按路径顺序排列，依次读取即与串行查询的顺序相同；取够 limit 条后关闭扫描，剩余的分片不再执行
+                    scan = self.iter_parallel_scan(spec, columns, spec['conditions'], spec['params'], ordered=True,
+                                                   limit=None if spec['line_filter'] else limit,
+                                                   cancel_event=cancel_event, folder_path=folder_path)
+                    cursor = RowStream(row for rows in scan for row in rows)
+                else:
+                    query = f"SELECT {', '.join(columns)} {spec['from_sql']}"
+                    if spec['conditions']:
+                        query += " WHERE " + " AND ".join(spec['conditions'])
+                    query += f" ORDER BY f.file_path, {spec['order_column']}"
+                    if not spec['line_filter']:
+                        query += f" LIMIT {int(limit)}"
+                    cursor.execute(query, spec['params'])
+
+                count = 0
+                batch = []
+                while count < limit:
+                    # 按块存储时在 Python 中逐行过滤，每取一批检查一次是否已取消
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for file_path, line_info, content in rows:
+                        for result in self.iter_result_lines(spec, file_path, line_info, content):
+                            batch.append(result)
+                            count += 1
+                            if count >= limit:
+                                break
+                        if count >= limit:
                             break
-            else:
-                if self.fts_enabled:
-                    # 使用全文搜索（快速）
-                    query = """
-                        SELECT f.file_path, fc.line_number, fc.content
-                        FROM file_contents fc
-                        JOIN files f ON fc.file_id = f.id
-                        WHERE fc.content MATCH ?
-                    """
-                    params = [keyword]
-                    
-                    if folder_path:
-                        query += " AND f.file_path LIKE ?"
-                        params.append(f"{folder_path}%")
-                    
-                    query += " ORDER BY f.file_path, fc.line_number LIMIT 10000"
+                    if len(batch) >= batch_size:
+                        if result_cache is not None:
+                            collected.extend(batch)
+                        yield batch
+                        batch = []
+                if batch:
+                    if result_cache is not None:
+                        collected.extend(batch)
+                    yield batch
+                # 只缓存完整结束（未取消、未出错）的搜索
+                if result_cache is not None:
+                    result_cache.put(cache_key, collected)
+
+        except re.error as e:
+            self.report_error(f"正则表达式无效: {str(e)}")
+        except sqlite3.Error as e:
+            # 被取消时 SQLite 报告 interrupted，不算错误
+            if cancel_event is None or not cancel_event.is_set():
+                self.report_error(f"搜索失败: {str(e)}")
+        finally:
+            if scan is not None:
+                scan.close()
+
+    def search_page(self, keyword, folder_path=None, use_regex=False, after=None, page_size=None,
+                    cancel_event=None, prefix=False):
+        """分页搜索：返回 (本页结果列表, 下一页的起点)，没有更多结果时起点为 None
+
+        按 (文件路径, 内容行 rowid) 做键集分页，after 为上一页返回的起点（首页为 None），
+        每页只查询需要的行，翻页不会重新读取前面的结果。按块存储时起点是块的 rowid，
+        一页以整块结束，结果数可能略多于 page_size
+        """
+        if page_size is None:
+            page_size = self.search_page_size
+        if after is not None:
+            # 从磁盘缓存读出的起点是列表
+            after = tuple(after)
+        if self.load_schema_state() is None:
+            return [], None
+
+        scan = None
+        try:
+            with self.read_connection() as conn:
+                if cancel_event is not None:
+                    conn.set_progress_handler(cancel_event.is_set, 1000)
+
+                result_cache = self.get_result_cache()
+                if result_cache is not None:
+                    cache_key = ('page', keyword, folder_path, use_regex, prefix, after, page_size,
+                                 self.get_index_version(conn))
+                    cached = result_cache.get(cache_key)
+                    if cached is not None:
+                        return cached['results'], cached['next']
+
+                spec = self.build_search_query(keyword, folder_path, use_regex, prefix)
+                conditions = list(spec['conditions'])
+                params = list(spec['params'])
+                if after is not None:
+                    conditions.append(f"(f.file_path, {spec['order_column']}) > (?, ?)")
+                    params.extend(after)
+                columns = ["f.file_path", spec['order_column'], spec['line_column'], spec['content_column']]
+
+                cursor = conn.cursor()
+                if self.use_parallel_scan(spec):
+                    # 分片按路径顺序排列并跳过起点之前的文件，依次读取到本页已满即可
+                    scan = self.iter_parallel_scan(spec, columns, conditions, params, ordered=True,
+                                                   limit=None if spec['line_filter'] else page_size + 1,
+                                                   cancel_event=cancel_event, folder_path=folder_path,
+                                                   start_path=after[0] if after is not None else None)
+                    cursor = RowStream(row for rows in scan for row in rows)
                 else:
-                    # 使用 LIKE 搜索（较慢但兼容性好）
-                    query = """
-                        SELECT f.file_path, fc.line_number, fc.content
-                        FROM file_contents fc
-                        JOIN files f ON fc.file_id = f.id
-                        WHERE fc.content LIKE ?
-                    """
-                    params = [f"%{keyword}%"]
-                    
-                    if folder_path:
-                        query += " AND f.file_path LIKE ?"
-                        params.append(f"{folder_path}%")
-                    
-                    query += " ORDER BY f.file_path, fc.line_number LIMIT 10000"
-                
-                self.cursor.execute(query, params)
-                
-                for row in self.cursor.fetchall():
-                    results.append({
-                        "file_path": row[0],
-                        "line_number": row[1],
-                        "line_content": row[2]
-                    })
-            
+                    query = f"SELECT {', '.join(columns)} {spec['from_sql']}"
+                    if conditions:
+                        query += " WHERE " + " AND ".join(conditions)
+                    query += f" ORDER BY f.file_path, {spec['order_column']}"
+                    if not spec['line_filter']:
+                        # 每条记录就是一个结果，多取一条用于判断是否还有下一页
+                        query += " LIMIT ?"
+                        params.append(page_size + 1)
+                    cursor.execute(query, params)
+
+                results = []
+                next_key = None
+                page_full = False
+                while not page_full:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return [], None
+                    rows = cursor.fetchmany(200)
+                    if not rows:
+                        break
+                    for index, (file_path, key, line_info, content) in enumerate(rows):
+                        results.extend(self.iter_result_lines(spec, file_path, line_info, content))
+                        if len(results) >= page_size:
+                            # 本页已满：后面还有记录时以最后处理的记录作为下一页的起点
+                            page_full = True
+                            if index + 1 < len(rows) or cursor.fetchone() is not None:
+                                next_key = (file_path, key)
+                            break
+
+                if result_cache is not None:
+                    result_cache.put(cache_key, {'results': results, 'next': next_key},
+                                     size=result_cache.estimate_size(results) + 300)
+                return results, next_key
+
+        except re.error as e:
+            self.report_error(f"正则表达式无效: {str(e)}")
         except sqlite3.Error as e:
-            self.indexing_error.emit(f"搜索失败: {str(e)}")
+            if cancel_event is None or not cancel_event.is_set():
+                self.report_error(f"搜索失败: {str(e)}")
         finally:
-            if self.conn:
-                self.conn.close()
-                self.conn = None
-                self.cursor = None
-        
-        return results
+            if scan is not None:
+                scan.close()
+        return [], None
+
+    def count_search_results(self, keyword, folder_path=None, use_regex=False, cancel_event=None,
+                             prefix=False, word_match=False):
+        """统计匹配的总行数，只执行 COUNT(*) 而不读取结果
+
+        按块存储的索引需要在 Python 中逐行过滤，无法直接统计，返回 None；
+        查询出错或被取消时同样返回 None
+        """
+        if self.load_schema_state() is None:
+            return None
+
+        try:
+            spec = self.build_search_query(keyword, folder_path, use_regex, prefix, word_match)
+            if spec['line_filter']:
+                return None
+            with self.read_connection() as conn:
+                if cancel_event is not None:
+                    conn.set_progress_handler(cancel_event.is_set, 1000)
+
+                result_cache = self.get_result_cache()
+                if result_cache is not None:
+                    cache_key = ('count', keyword, folder_path, use_regex, prefix, word_match,
+                                 self.get_index_version(conn))
+                    cached = result_cache.get(cache_key)
+                    if cached is not None:
+                        return cached
+
+                if self.use_parallel_scan(spec):
+                    # 每个分片对每个 rowid 区间返回一行计数
+                    count = sum(row[0] for rows in self.iter_parallel_scan(
+                        spec, ["COUNT(*)"], spec['conditions'], spec['params'], cancel_event=cancel_event,
+                        folder_path=folder_path) for row in rows)
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                else:
+                    query = f"SELECT COUNT(*) {spec['from_sql']}"
+                    if spec['conditions']:
+                        query += " WHERE " + " AND ".join(spec['conditions'])
+                    count = conn.execute(query, spec['params']).fetchone()[0]
+
+                if result_cache is not None:
+                    result_cache.put(cache_key, count, size=100)
+                return count
+        except (re.error, sqlite3.Error):
+            # 计数只是附加信息，失败时由分页查询报告错误
+            return None
+
+    def search_ranked(self, keyword, folder_path=None, top_files=None, lines_per_file=None,
+                      cancel_event=None, prefix=False):
+        """按相关度搜索：用 bm25() 给命中的行打分并按文件累加，只返回得分最高的 top_files 个文件
+
+        第一遍只读取 rowid、file_id 和得分，不排序整个命中集合，用堆取出最相关的文件；
+        第二遍按 rowid 只读取这些文件的匹配行（每个文件最多 lines_per_file 行）。
+        结果按文件相关度排列，同一文件内按行号排列，每条结果带有所属文件的 score（越小越相关）。
+        需要 FTS5 索引，没有时退回按路径排序的普通搜索
+        """
+        if top_files is None:
+            top_files = self.ranked_top_files
+        if lines_per_file is None:
+            lines_per_file = self.ranked_lines_per_file
+        if self.load_schema_state() is None:
+            return []
+        if not self.fts_enabled:
+            return self.search_content(keyword, folder_path, cancel_event=cancel_event, prefix=prefix)
+
+        table = self.content_table
+        try:
+            with self.read_connection() as conn:
+                if cancel_event is not None:
+                    conn.set_progress_handler(cancel_event.is_set, 1000)
+
+                result_cache = self.get_result_cache()
+                if result_cache is not None:
+                    cache_key = ('ranked', keyword, folder_path, prefix, top_files, lines_per_file,
+                                 self.get_index_version(conn))
+                    cached = result_cache.get(cache_key)
+                    if cached is not None:
+                        return cached
+
+                spec = self.build_search_query(keyword, folder_path, prefix=prefix, word_match=True)
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT fc.rowid, fc.file_id, bm25({table}) {spec['from_sql']} "
+                    f"WHERE {' AND '.join(spec['conditions'])}",
+                    spec['params'])
+
+                # 文件 id -> [累计得分, 命中的前 lines_per_file 个 rowid]（FTS5 按 rowid 顺序返回命中）
+                files = {}
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return []
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    for rowid, file_id, score in rows:
+                        entry = files.get(file_id)
+                        if entry is None:
+                            files[file_id] = [score, [rowid]]
+                        else:
+                            entry[0] += score
+                            if len(entry[1]) < lines_per_file:
+                                entry[1].append(rowid)
+
+                top = heapq.nsmallest(top_files, files.items(), key=lambda item: item[1][0])
+                if not top:
+                    return []
+
+                file_ids = [file_id for file_id, _ in top]
+                placeholders = ",".join("?" * len(file_ids))
+                file_paths = dict(cursor.execute(
+                    f"SELECT id, file_path FROM files WHERE id IN ({placeholders})", file_ids).fetchall())
+
+                # 只读取入选文件的命中行；按块存储时要借助 MATCH 才能用 highlight() 标出命中的行
+                rowids = [rowid for _, (_, file_rowids) in top for rowid in file_rowids]
+                lines_by_file = {}
+                for start in range(0, len(rowids), 500):
+                    batch = rowids[start:start + 500]
+                    query = (f"SELECT fc.file_id, {spec['line_column']}, {spec['content_column']} "
+                             f"FROM {table} fc WHERE fc.rowid IN ({','.join('?' * len(batch))})")
+                    params = batch
+                    if spec['chunked']:
+                        query += " AND fc.content MATCH ?"
+                        params = batch + [self.build_match_query(keyword, prefix)]
+                    for file_id, line_info, content in cursor.execute(query, params):
+                        lines_by_file.setdefault(file_id, []).append((line_info, content))
+
+                results = []
+                for file_id, (score, _) in top:
+                    file_path = file_paths.get(file_id)
+                    if file_path is None:
+                        continue
+                    file_results = []
+                    for line_info, content in sorted(lines_by_file.get(file_id, ())):
+                        file_results.extend(self.iter_result_lines(spec, file_path, line_info, content))
+                    for result in file_results[:lines_per_file]:
+                        result['score'] = score
+                        results.append(result)
+
+                if result_cache is not None:
+                    result_cache.put(cache_key, results)
+                return results
+
+        except sqlite3.Error as e:
+            if cancel_event is None or not cancel_event.is_set():
+                self.report_error(f"搜索失败: {str(e)}")
+        return []
 
     def format_size(self, size):
         """格式化文件大小"""
@@ -727,55 +2555,55 @@ class FileIndexer(QObject):
             size /= 1024.0
         return f"{size:.2f} TB"
 
+    def format_throughput(self, file_count, total_size, elapsed):
+        """格式化索引吞吐量"""
+        if elapsed <= 0:
+            return "0.0 文件/秒，0.00 MB/秒"
+        return f"{file_count / elapsed:.1f} 文件/秒，{total_size / 1024 / 1024 / elapsed:.2f} MB/秒"
+
     def get_index_info(self):
         """获取索引信息"""
-        if not self.connect_db():
+        if self.load_schema_state() is None:
             return None
         
         try:
-            info = {}
-            
-            # 获取文件数量
-            self.cursor.execute("SELECT COUNT(*) FROM files")
-            info['file_count'] = self.cursor.fetchone()[0]
-            
-            # 获取文件类型分布
-            self.cursor.execute("""
-                SELECT file_ext, COUNT(*) as count, SUM(file_size) as total_size
-                FROM files
-                GROUP BY file_ext
-                ORDER BY count DESC
-                LIMIT 10
-            """)
-            info['file_types'] = self.cursor.fetchall()
-            
-            # 获取总大小
-            self.cursor.execute("SELECT SUM(file_size) FROM files")
-            total_size = self.cursor.fetchone()[0] or 0
-            info['total_size'] = total_size
-            info['total_size_str'] = self.format_size(total_size)
-            
-            # 获取索引大小
-            db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
-            info['index_size'] = db_size
-            info['index_size_str'] = self.format_size(db_size)
-            
-            # 计算压缩率
-            if total_size > 0:
-                info['compression_ratio'] = f"{(db_size / total_size * 100):.1f}%"
-            else:
-                info['compression_ratio'] = "N/A"
-            
-            # 获取最后索引时间
-            self.cursor.execute("SELECT MAX(indexed_at) FROM files")
-            last_indexed = self.cursor.fetchone()[0]
-            info['last_indexed'] = last_indexed or "从未索引"
-            
-            return info
+            with self.read_connection() as conn:
+                cursor = conn.cursor()
+                info = {}
+                
+                # 文件数量、类型分布和总大小都来自按扩展名汇总的统计表
+                cursor.execute("SELECT IFNULL(SUM(file_count), 0), IFNULL(SUM(total_size), 0) FROM file_stats")
+                file_count, total_size = cursor.fetchone()
+                info['file_count'] = file_count
+                
+                # 获取文件类型分布
+                cursor.execute("""
+                    SELECT file_ext, file_count, total_size
+                    FROM file_stats
+                    ORDER BY file_count DESC
+                    LIMIT 10
+                """)
+                info['file_types'] = cursor.fetchall()
+                
+                info['total_size'] = total_size
+                info['total_size_str'] = self.format_size(total_size)
+                
+                # 获取索引大小
+                db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+                info['index_size'] = db_size
+                info['index_size_str'] = self.format_size(db_size)
+                
+                # 计算压缩率
+                if total_size > 0:
+                    info['compression_ratio'] = f"{(db_size / total_size * 100):.1f}%"
+                else:
+                    info['compression_ratio'] = "N/A"
+                
+                # 获取最后索引时间
+                row = cursor.execute("SELECT value FROM index_meta WHERE key = 'last_indexed'").fetchone()
+                last_indexed = row[0] if row else None
+                info['last_indexed'] = last_indexed or "从未索引"
+                
+                return info
         except:
             return None
-        finally:
-            if self.conn:
-                self.conn.close()
-                self.conn = None
-                self.cursor = None
\ No newline at end of file
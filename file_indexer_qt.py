@@ -0,0 +1,18 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+from file_indexer import FileIndexer
+
+
+class QtFileIndexer(FileIndexer, QObject):
+    """FileIndexer 的 Qt 适配器：进度、错误和完成通知以信号发出，可以移到 QThread 中运行"""
+    indexing_progress = pyqtSignal(str)
+    indexing_finished = pyqtSignal(int)
+    indexing_error = pyqtSignal(str)
+
+    def report_progress(self, message):
+        self.indexing_progress.emit(message)
+
+    def report_error(self, message):
+        self.indexing_error.emit(message)
+
+    def report_finished(self, count):
+        self.indexing_finished.emit(count)
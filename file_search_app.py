@@ -1,35 +1,131 @@
+import time
+
+# 启动计时的起点，尽量早记录（界面可交互所需的时间包括导入模块的时间）
+STARTUP_TIME = time.perf_counter()
+
 import sys
 import os
 import re
+import shutil
+import threading
+from collections import OrderedDict
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QLabel, QFileDialog, QStatusBar,
-    QMessageBox, QCheckBox, QTreeWidget, QTreeWidgetItem,
+    QMessageBox, QCheckBox, QTreeView,
     QStyledItemDelegate, QStyle, QGroupBox, QTextEdit,
     QSpinBox, QTabWidget, QTableWidget, QTableWidgetItem,
-    QHeaderView
+    QHeaderView, QComboBox, QStyleOptionViewItem
+)
+from PyQt5.QtCore import (
+    Qt, QObject, QThread, QTimer, pyqtSignal, QAbstractItemModel, QModelIndex, QSettings
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize
-from PyQt5.QtGui import QFont, QTextDocument, QPalette
-from file_indexer import FileIndexer
+from PyQt5.QtGui import QFont, QFontMetrics, QColor
+from file_indexer import FileIndexer, HASH_ALGORITHMS
+from file_indexer_qt import QtFileIndexer
 
 import subprocess
 import platform
 
 
+def vscode_candidates():
+    """按优先级列出当前系统上可能的 VSCode 命令行程序"""
+    system = platform.system().lower()
+    if system == "windows":
+        # Windows下尝试不同的VSCode命令和常见安装路径
+        return [
+            "code",
+            "code.exe",
+            os.path.join(os.environ.get("ProgramFiles", "C:\\Program Files"), "Microsoft VS Code", "bin", "code.cmd"),
+            os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local")), "Programs", "Microsoft VS Code", "bin", "code.cmd")
+        ]
+    elif system == "darwin":  # macOS
+        return [
+            "code",
+            "/usr/local/bin/code",
+            "/Applications/Visual Studio Code.app/Contents/Resources/app/bin/code"
+        ]
+    else:  # Linux和其他Unix系统
+        return [
+            "code",
+            "/usr/bin/code",
+            "/usr/local/bin/code"
+        ]
+
+
+def find_vscode_command():
+    """查找可用的 VSCode 命令（只在 PATH 和常见安装路径中查找，不启动程序），找不到时返回空字符串"""
+    for cmd in vscode_candidates():
+        path = shutil.which(cmd)
+        if path:
+            return path
+    return ""
+
+
 class FileSearchApp(QWidget):
+    # 发给搜索线程的请求：(搜索编号, 关键词, 文件夹, 是否正则, 是否为边输入边搜索, 是否按相关度排序)
+    search_requested = pyqtSignal(int, str, str, bool, bool, bool)
+    # 请求当前搜索的下一页结果：(搜索编号)
+    more_results_requested = pyqtSignal(int)
+    # 请求在搜索线程中读取索引信息
+    index_info_requested = pyqtSignal()
+    # 后台检测到的 VSCode 命令（未找到时为空字符串）
+    vscode_detected = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("文件内容搜索工具")
         self.setGeometry(100, 100, 1000, 700)
+
+        # 搜索和读取索引信息共用一个 FileIndexer，复用其只读连接池
+        self.search_indexer = QtFileIndexer()
+        self.search_indexer.indexing_progress.connect(self.update_status)
+        self.search_indexer.indexing_error.connect(self.search_error)
+
+        # 启动各阶段耗时（秒，自 STARTUP_TIME 起）
+        self.startup_timings = {}
+        self.settings = QSettings("FileSearchTool", "FileSearchApp")
+
         self.init_ui()
+
+        # 常驻的搜索线程：搜索请求通过信号排队发给其中的工作对象，界面线程不会被查询阻塞
+        self.search_id = None
+        self.search_loading = False
+        # 创建、更新或清空索引正在进行
+        self.indexing_running = False
+        self.search_thread = QThread()
+        self.search_worker = SearchWorker(self.search_indexer)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_worker.results_ready.connect(self.append_search_results)
+        self.search_worker.page_done.connect(self.search_page_finished)
+        self.search_worker.count_ready.connect(self.search_count_ready)
+        self.search_worker.index_info_ready.connect(self.show_index_info)
+        self.search_requested.connect(self.search_worker.run)
+        self.index_info_requested.connect(self.search_worker.load_index_info)
+        # 实时更新索引的监视线程，开启时才创建
+        self.index_watcher = None
+        self.more_results_requested.connect(self.search_worker.fetch_more)
+        scroll_bar = self.results_tree.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self.fetch_more_if_needed)
+        scroll_bar.rangeChanged.connect(self.fetch_more_if_needed)
+        self.search_thread.start()
+
+        # 索引信息在搜索线程中读取（首次访问数据库时还要检查表结构），不阻塞窗口显示
         self.load_index_info()
 
-        # 检查VSCode是否可用
-        if self.check_vscode_availability():
-            self.status_bar.showMessage("准备就绪 - VSCode已检测到")
+        # 使用上次检测到的 VSCode 命令；没有记录或记录的程序已不存在时在后台重新检测
+        # （只记录检测成功的结果，之后安装的 VSCode 在下次启动时即可检测到）
+        self.vscode_command = self.settings.value("editor/vscode_command", "")
+        self.vscode_detected.connect(self.vscode_detection_finished)
+        if not self.vscode_command or not shutil.which(self.vscode_command):
+            self.vscode_command = ""
+            threading.Thread(target=lambda: self.vscode_detected.emit(find_vscode_command()), daemon=True).start()
         else:
-            self.status_bar.showMessage("准备就绪 - 未检测到VSCode，将使用默认程序打开文件")
+            self.show_vscode_status()
+
+        self.mark_startup("window")
+        # 事件循环开始处理事件时窗口即可交互
+        QTimer.singleShot(0, lambda: self.mark_startup("interactive"))
 
     def init_ui(self):
         main_layout = QVBoxLayout()
@@ -61,21 +157,48 @@ class FileSearchApp(QWidget):
         self.search_input.returnPressed.connect(self.start_search)  # 回车触发搜索
         self.search_button = QPushButton("搜索")
         self.search_button.clicked.connect(self.start_search)
+        self.stop_search_button = QPushButton("停止")
+        self.stop_search_button.setEnabled(False)
+        self.stop_search_button.clicked.connect(self.stop_search)
         self.use_regex_checkbox = QCheckBox("使用正则表达式")
+        # 按相关度排序：只显示 bm25 得分最高的文件，最相关的文件排在最前
+        self.ranked_search_checkbox = QCheckBox("按相关度排序")
+        self.ranked_search_checkbox.setToolTip("需要 FTS5 索引，使用正则表达式时不生效")
+        # 边输入边搜索：停止输入一小段时间后自动按前缀搜索
+        self.incremental_search_checkbox = QCheckBox("输入时搜索")
+        self.search_debounce_timer = QTimer(self)
+        self.search_debounce_timer.setSingleShot(True)
+        self.search_debounce_timer.setInterval(200)
+        self.search_debounce_timer.timeout.connect(self.start_incremental_search)
+        self.search_input.textChanged.connect(self.search_text_changed)
         search_control_layout.addWidget(self.search_label)
         search_control_layout.addWidget(self.search_input)
         search_control_layout.addWidget(self.use_regex_checkbox)
+        search_control_layout.addWidget(self.ranked_search_checkbox)
+        search_control_layout.addWidget(self.incremental_search_checkbox)
         search_control_layout.addWidget(self.search_button)
+        search_control_layout.addWidget(self.stop_search_button)
         search_layout.addLayout(search_control_layout)
 
         # 结果显示区域
-        self.results_tree = QTreeWidget()
-        self.results_tree.setHeaderLabels(["文件/行号", "内容"])
+        # 结果视图只为可见行向模型取数据，大量结果也不会卡顿
+        self.results_model = SearchResultModel(self)
+        self.results_tree = QTreeView()
+        self.results_tree.setModel(self.results_model)
         self.results_tree.setColumnWidth(0, 300)
         self.results_tree.setAlternatingRowColors(True)
-        self.results_tree.itemDoubleClicked.connect(self.open_in_vscode)
+        self.results_tree.setUniformRowHeights(True)
+        self.results_tree.doubleClicked.connect(self.open_in_vscode)
+        # 搜索线程送来的结果先暂存，每隔一小段时间合并显示一次
+        self.pending_results = []
+        self.result_flush_timer = QTimer(self)
+        self.result_flush_timer.setSingleShot(True)
+        self.result_flush_timer.setInterval(50)
+        self.result_flush_timer.timeout.connect(self.flush_search_results)
         self.results_tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.results_tree.customContextMenuRequested.connect(self.show_context_menu)
+        # 自定义绘制以显示HTML
+        self.results_tree.setItemDelegate(HighlightDelegate(self.results_tree))
         search_layout.addWidget(self.results_tree)
         
         search_tab.setLayout(search_layout)
@@ -103,6 +226,10 @@ class FileSearchApp(QWidget):
         index_button_layout.addWidget(self.update_index_button)
         index_button_layout.addWidget(self.clear_index_button)
         index_button_layout.addWidget(self.refresh_info_button)
+        self.watch_index_checkbox = QCheckBox("实时更新索引")
+        self.watch_index_checkbox.setToolTip("监视文件夹的变化，只重新索引变化的文件")
+        self.watch_index_checkbox.toggled.connect(self.toggle_index_watch)
+        index_button_layout.addWidget(self.watch_index_checkbox)
         index_button_layout.addStretch()
         index_layout.addLayout(index_button_layout)
         
@@ -121,6 +248,71 @@ class FileSearchApp(QWidget):
         max_size_layout.addWidget(self.max_file_size_spin)
         max_size_layout.addStretch()
         settings_layout.addLayout(max_size_layout)
+
+        # 大文件模式设置
+        large_file_layout = QHBoxLayout()
+        self.large_file_checkbox = QCheckBox("大文件模式（不跳过大文件，超长行切分索引）")
+        large_file_layout.addWidget(self.large_file_checkbox)
+        large_file_layout.addWidget(QLabel("单文件索引上限 (MB):"))
+        self.file_budget_spin = QSpinBox()
+        self.file_budget_spin.setMinimum(0)
+        self.file_budget_spin.setMaximum(100000)
+        self.file_budget_spin.setValue(256)
+        self.file_budget_spin.setSpecialValueText("不限制")
+        self.file_budget_spin.setSuffix(" MB")
+        large_file_layout.addWidget(self.file_budget_spin)
+        large_file_layout.addStretch()
+        settings_layout.addLayout(large_file_layout)
+
+        # 并行索引线程数设置
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("索引线程数:"))
+        self.index_workers_spin = QSpinBox()
+        self.index_workers_spin.setMinimum(0)
+        self.index_workers_spin.setMaximum(64)
+        self.index_workers_spin.setSpecialValueText("单线程")
+        self.index_workers_spin.setValue(min(os.cpu_count() or 1, 8))
+        workers_layout.addWidget(self.index_workers_spin)
+        workers_layout.addWidget(QLabel("目录扫描线程数:"))
+        self.scan_threads_spin = QSpinBox()
+        self.scan_threads_spin.setMinimum(1)
+        self.scan_threads_spin.setMaximum(64)
+        self.scan_threads_spin.setValue(1)
+        self.scan_threads_spin.setToolTip("网络文件系统上可调大，以并发扫描目录")
+        workers_layout.addWidget(self.scan_threads_spin)
+        workers_layout.addWidget(QLabel("正则扫描进程数:"))
+        self.regex_workers_spin = QSpinBox()
+        self.regex_workers_spin.setMinimum(0)
+        self.regex_workers_spin.setMaximum(64)
+        self.regex_workers_spin.setSpecialValueText("不并行")
+        # 默认不并行：首次使用时启动进程池需要时间，由用户按需开启
+        self.regex_workers_spin.setValue(0)
+        self.regex_workers_spin.setToolTip("无法用索引缩小范围的正则搜索会分片交给多个进程并行扫描")
+        workers_layout.addWidget(self.regex_workers_spin)
+        workers_layout.addStretch()
+        settings_layout.addLayout(workers_layout)
+
+        # 增量更新时是否对所有文件计算哈希
+        self.paranoid_check_checkbox = QCheckBox("严格校验（更新索引时计算所有文件的哈希，较慢）")
+        settings_layout.addWidget(self.paranoid_check_checkbox)
+
+        # 文件哈希算法
+        hash_layout = QHBoxLayout()
+        hash_layout.addWidget(QLabel("哈希算法:"))
+        self.hash_algorithm_combo = QComboBox()
+        self.hash_algorithm_combo.addItems(list(HASH_ALGORITHMS))
+        self.hash_algorithm_combo.setToolTip("切换算法后，下次更新索引时已变化的文件会重新计算哈希")
+        hash_layout.addWidget(self.hash_algorithm_combo)
+        hash_layout.addStretch()
+        settings_layout.addLayout(hash_layout)
+
+        # 三元组索引
+        self.trigram_index_checkbox = QCheckBox("建立三元组索引（加速正则表达式搜索，索引体积更大）")
+        settings_layout.addWidget(self.trigram_index_checkbox)
+
+        # 内容存储布局（仅在创建新索引时生效）
+        self.chunk_storage_checkbox = QCheckBox("按块存储文件内容（索引更小、写入更快，创建新索引时生效）")
+        settings_layout.addWidget(self.chunk_storage_checkbox)
         
         settings_group.setLayout(settings_layout)
         index_layout.addWidget(settings_group)
@@ -190,15 +382,22 @@ class FileSearchApp(QWidget):
         # 清空日志
         self.index_log_text.clear()
         self.status_bar.showMessage("正在创建索引...")
-        self.results_tree.clear()
+        self.results_model.reset()
         self.set_index_buttons_enabled(False)
 
         # 获取设置
         max_file_size = self.max_file_size_spin.value() * 1024 * 1024
 
         self.indexer_thread = QThread()
-        self.file_indexer = FileIndexer()
+        self.file_indexer = QtFileIndexer()
         self.file_indexer.max_file_size = max_file_size
+        self.file_indexer.large_file_mode = self.large_file_checkbox.isChecked()
+        self.file_indexer.file_byte_budget = self.file_budget_spin.value() * 1024 * 1024
+        self.file_indexer.index_workers = self.index_workers_spin.value()
+        self.file_indexer.storage_layout = 'chunk' if self.chunk_storage_checkbox.isChecked() else 'line'
+        self.file_indexer.scan_threads = self.scan_threads_spin.value()
+        self.file_indexer.trigram_index = self.trigram_index_checkbox.isChecked()
+        self.file_indexer.hash_algorithm = self.hash_algorithm_combo.currentText()
         self.file_indexer.moveToThread(self.indexer_thread)
 
         self.file_indexer.indexing_progress.connect(self.update_index_log)
@@ -218,15 +417,21 @@ class FileSearchApp(QWidget):
         # 清空日志
         self.index_log_text.clear()
         self.status_bar.showMessage("正在更新索引...")
-        self.results_tree.clear()
+        self.results_model.reset()
         self.set_index_buttons_enabled(False)
 
         # 获取设置
         max_file_size = self.max_file_size_spin.value() * 1024 * 1024
 
         self.indexer_thread = QThread()
-        self.file_indexer = FileIndexer()
+        self.file_indexer = QtFileIndexer()
         self.file_indexer.max_file_size = max_file_size
+        self.file_indexer.large_file_mode = self.large_file_checkbox.isChecked()
+        self.file_indexer.file_byte_budget = self.file_budget_spin.value() * 1024 * 1024
+        self.file_indexer.paranoid_check = self.paranoid_check_checkbox.isChecked()
+        self.file_indexer.scan_threads = self.scan_threads_spin.value()
+        self.file_indexer.trigram_index = self.trigram_index_checkbox.isChecked()
+        self.file_indexer.hash_algorithm = self.hash_algorithm_combo.currentText()
         self.file_indexer.moveToThread(self.indexer_thread)
 
         self.file_indexer.indexing_progress.connect(self.update_index_log)
@@ -236,10 +441,63 @@ class FileSearchApp(QWidget):
         self.indexer_thread.started.connect(lambda: self.file_indexer.update_index(folder_path))
         self.indexer_thread.start()
 
+    def toggle_index_watch(self, checked):
+        """开启或关闭实时更新：监视文件夹的变化，把一段时间内的变化合并后只重新索引变化的路径"""
+        if not checked:
+            self.stop_index_watch()
+            return
+
+        folder_path = self.folder_path_input.text()
+        if not folder_path or not os.path.isdir(folder_path):
+            QMessageBox.warning(self, "错误", "请选择一个有效的文件夹。")
+            self.watch_index_checkbox.setChecked(False)
+            return
+
+        self.watch_thread = QThread()
+        indexer = QtFileIndexer()
+        indexer.max_file_size = self.max_file_size_spin.value() * 1024 * 1024
+        indexer.large_file_mode = self.large_file_checkbox.isChecked()
+        indexer.file_byte_budget = self.file_budget_spin.value() * 1024 * 1024
+        indexer.paranoid_check = self.paranoid_check_checkbox.isChecked()
+        indexer.trigram_index = self.trigram_index_checkbox.isChecked()
+        indexer.hash_algorithm = self.hash_algorithm_combo.currentText()
+        indexer.indexing_progress.connect(self.update_index_log)
+        indexer.indexing_error.connect(self.index_watch_error)
+        from file_watcher import IndexWatcher
+        self.index_watcher = IndexWatcher(indexer, [folder_path])
+        indexer.moveToThread(self.watch_thread)
+        self.index_watcher.moveToThread(self.watch_thread)
+
+        self.index_watcher.watch_message.connect(self.update_index_log)
+        self.index_watcher.batch_indexed.connect(self.index_watch_batch_finished)
+        self.watch_thread.started.connect(self.index_watcher.run)
+        self.watch_thread.start()
+
+    def stop_index_watch(self):
+        if self.index_watcher is None:
+            return
+        self.index_watcher.stop()
+        self.watch_thread.quit()
+        self.watch_thread.wait()
+        self.index_watcher = None
+        self.update_index_log("已停止实时更新索引")
+
+    def index_watch_batch_finished(self, changed):
+        if changed:
+            # 索引内容已变化，缓存的前缀搜索结果不再可用
+            self.search_worker.clear_cache()
+            self.load_index_info()
+
+    def index_watch_error(self, message):
+        # 监视线程会在稍后重试，只记录在日志中而不弹出对话框
+        self.index_log_text.append(f"错误: {message}")
+
     def set_index_buttons_enabled(self, enabled):
-        """设置索引相关按钮的启用状态"""
-        self.create_index_button.setEnabled(enabled)
-        self.update_index_button.setEnabled(enabled)
+        """设置索引相关按钮的启用状态（索引操作开始时禁用，结束时启用）"""
+        self.indexing_running = not enabled
+        # 创建和更新索引按钮在搜索结束后才启用
+        self.create_index_button.setEnabled(enabled and not self.search_loading)
+        self.update_index_button.setEnabled(enabled and not self.search_loading)
         self.search_button.setEnabled(enabled)
         self.clear_index_button.setEnabled(enabled)
         self.rebuild_db_button.setEnabled(enabled)
@@ -255,6 +513,7 @@ class FileSearchApp(QWidget):
 
     def indexing_finished(self, count):
         self.status_bar.showMessage(f"索引操作完成。")
+        self.search_worker.clear_cache()
         self.set_index_buttons_enabled(True)
         self.indexer_thread.quit()
         self.indexer_thread.wait()
@@ -272,39 +531,44 @@ class FileSearchApp(QWidget):
 
     def show_context_menu(self, position):
         """显示右键菜单"""
-        item = self.results_tree.itemAt(position)
-        if item and item.parent() is not None:  # 只对行项目显示菜单
+        index = self.results_tree.indexAt(position)
+        if index.isValid() and index.data(SearchResultModel.LineNumberRole) is not None:  # 只对行项目显示菜单
+            file_path = index.data(SearchResultModel.FilePathRole)
             from PyQt5.QtWidgets import QMenu, QAction
             
             menu = QMenu(self)
             
             # 在VSCode中打开
             open_vscode_action = QAction("在VSCode中打开", self)
-            open_vscode_action.triggered.connect(lambda: self.open_in_vscode(item, 0))
+            open_vscode_action.triggered.connect(lambda: self.open_in_vscode(index))
             menu.addAction(open_vscode_action)
             
             # 用默认程序打开
             open_default_action = QAction("用默认程序打开", self)
-            open_default_action.triggered.connect(lambda: self.open_file_with_default(item.parent().toolTip(0)))
+            open_default_action.triggered.connect(lambda: self.open_file_with_default(file_path))
             menu.addAction(open_default_action)
             
             # 复制文件路径
             copy_path_action = QAction("复制文件路径", self)
-            copy_path_action.triggered.connect(lambda: QApplication.clipboard().setText(item.parent().toolTip(0)))
+            copy_path_action.triggered.connect(lambda: QApplication.clipboard().setText(file_path))
             menu.addAction(copy_path_action)
             
             # 复制行内容
             copy_content_action = QAction("复制行内容", self)
-            copy_content_action.triggered.connect(lambda: QApplication.clipboard().setText(item.data(1, Qt.UserRole) or item.text(1)))
+            copy_content_action.triggered.connect(
+                lambda: QApplication.clipboard().setText(index.data(SearchResultModel.LineContentRole)))
             menu.addAction(copy_content_action)
             
             menu.exec_(self.results_tree.mapToGlobal(position))
 
     def load_index_info(self):
-        """加载并显示索引信息"""
-        indexer = FileIndexer()
-        info = indexer.get_index_info()
-        
+        """请求搜索线程读取索引信息，读取完成后由 show_index_info 显示"""
+        self.index_info_requested.emit()
+
+    def show_index_info(self, info):
+        """显示索引信息"""
+        if "index_info" not in self.startup_timings:
+            self.mark_startup("index_info")
         if info:
             # 显示基本信息
             info_text = f"""索引统计信息：
@@ -321,11 +585,21 @@ class FileSearchApp(QWidget):
             for i, (ext, count, size) in enumerate(info['file_types']):
                 self.file_type_table.setItem(i, 0, QTableWidgetItem(ext or "无扩展名"))
                 self.file_type_table.setItem(i, 1, QTableWidgetItem(str(count)))
-                self.file_type_table.setItem(i, 2, QTableWidgetItem(indexer.format_size(size or 0)))
+                self.file_type_table.setItem(i, 2, QTableWidgetItem(self.search_indexer.format_size(size or 0)))
         else:
             self.index_info_text.setText("暂无索引信息")
             self.file_type_table.setRowCount(0)
 
+    def mark_startup(self, stage):
+        """记录启动阶段的耗时，各阶段都完成后输出启动耗时报告"""
+        self.startup_timings[stage] = time.perf_counter() - STARTUP_TIME
+        stages = [("window", "窗口创建"), ("interactive", "可交互"), ("index_info", "索引信息"), ("editor", "编辑器检测")]
+        if all(name in self.startup_timings for name, _ in stages):
+            report = "启动耗时：" + "，".join(f"{label} {self.startup_timings[name]:.3f} 秒" for name, label in stages)
+            self.index_log_text.append(report)
+            if os.environ.get("FILE_SEARCH_STARTUP_TIMING"):
+                print(report, file=sys.stderr)
+
     def start_search(self):
         folder_path = self.folder_path_input.text()
         keyword = self.search_input.text()
@@ -338,148 +612,173 @@ class FileSearchApp(QWidget):
             QMessageBox.warning(self, "错误", "请输入搜索关键词。")
             return
 
+        self.search_debounce_timer.stop()
+        self.submit_search(keyword, folder_path)
+
+    def search_text_changed(self, text):
+        # 正则表达式在输入过程中大多不完整，只对普通关键词边输入边搜索
+        if self.incremental_search_checkbox.isChecked() and not self.use_regex_checkbox.isChecked():
+            self.search_debounce_timer.start()
+
+    def start_incremental_search(self):
+        """防抖计时结束后发起前缀搜索，输入不完整时不弹出提示"""
+        folder_path = self.folder_path_input.text()
+        keyword = self.search_input.text()
+        if not folder_path or not os.path.isdir(folder_path) or not keyword.strip():
+            return
+        self.submit_search(keyword, folder_path, incremental=True)
+
+    def submit_search(self, keyword, folder_path, incremental=False):
+        # 新的搜索会取消仍在进行的旧搜索，旧搜索迟到的结果按编号丢弃
+        self.search_id = self.search_worker.begin_search()
+
         self.status_bar.showMessage(f"正在搜索 '{keyword}'...")
-        self.results_tree.clear()
-        self.create_index_button.setEnabled(False)
-        self.update_index_button.setEnabled(False)
-        self.search_button.setEnabled(False)
+        self.set_search_running(True)
+        self.search_total = None
+        self.search_incremental = incremental
+        self.search_ranked = self.ranked_search_checkbox.isChecked() and not self.use_regex_checkbox.isChecked()
 
-        self.search_thread = QThread()
-        self.file_indexer = FileIndexer()
-        self.file_indexer.moveToThread(self.search_thread)
+        # 流式显示结果的状态，高亮在显示到某一行时才生成
+        self.search_keyword = keyword
+        self.search_use_regex = self.use_regex_checkbox.isChecked()
+        use_regex = self.search_use_regex
+        self.results_model.reset(self.build_highlight_pattern(keyword, use_regex))
+        self.pending_results = []
 
-        self.file_indexer.indexing_progress.connect(self.update_status)
-        self.file_indexer.indexing_error.connect(self.search_error)
+        self.search_indexer.regex_scan_workers = self.regex_workers_spin.value()
+        self.search_requested.emit(self.search_id, keyword, folder_path, self.search_use_regex, incremental,
+                                   self.search_ranked)
 
-        self.search_thread.started.connect(lambda: self._run_search(keyword, folder_path))
-        self.search_thread.start()
+    def stop_search(self):
+        """取消正在进行的搜索，已显示的结果保留，不再加载后续页"""
+        if not self.search_loading:
+            return
+        self.search_worker.cancel()
+        self.search_id = None
+        self.result_flush_timer.stop()
+        self.flush_search_results()
+        self.results_model.has_more = False
+        self.status_bar.showMessage(f"搜索已取消。已显示 {self.results_model.result_count} 个匹配项。")
+        self.set_search_running(False)
+
+    def fetch_more_if_needed(self, *args):
+        """结果视图滚动到底部（或最后一个文件节点可见）时加载当前搜索的下一页
+
+        不用模型的 canFetchMore/fetchMore：QTreeView 每次重新布局（例如展开节点）都会调用 fetchMore，
+        会在用户没有滚动时连续加载很多页
+        """
+        model = self.results_model
+        if self.search_id is None or self.search_loading or not model.has_more:
+            return
+        # visualRect 会先完成视图中尚未执行的布局，之后滚动条的范围才是最新的
+        last_file = model.index(model.rowCount() - 1, 0)
+        viewport = self.results_tree.viewport()
+        scroll_bar = self.results_tree.verticalScrollBar()
+        if (not self.results_tree.visualRect(last_file).intersects(viewport.rect())
+                and scroll_bar.value() < scroll_bar.maximum()):
+            return
+        self.set_search_running(True)
+        self.status_bar.showMessage(f"正在加载更多 '{self.search_keyword}' 的结果...")
+        self.more_results_requested.emit(self.search_id)
+
+    def set_search_running(self, running):
+        self.search_loading = running
+        # 索引操作仍在进行时保持禁用
+        self.create_index_button.setEnabled(not running and not self.indexing_running)
+        self.update_index_button.setEnabled(not running and not self.indexing_running)
+        self.stop_search_button.setEnabled(running)
 
     def update_status(self, message):
         self.status_bar.showMessage(message)
 
-    def _run_search(self, keyword, folder_path):
-        use_regex = self.use_regex_checkbox.isChecked()
-        results = self.file_indexer.search_content(keyword, folder_path, use_regex)
-        self.search_finished(results, keyword)
-
-    def highlight_keyword(self, text, keyword, use_regex=False):
-        """高亮显示匹配的关键词"""
+    def build_highlight_pattern(self, keyword, use_regex=False):
+        """编译用于高亮关键词的正则，关键词为空或正则无效时返回 None"""
         if not keyword:
-            return text
-        
-        # 转义HTML特殊字符
-        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            return None
         
         # 转义特殊字符，避免在非正则模式下出错
         if not use_regex:
             keyword = re.escape(keyword)
         
         try:
-            # 使用HTML标签高亮显示
-            highlighted = re.sub(
-                f'({keyword})', 
-                r'<span style="background-color: yellow; font-weight: bold;">\1</span>', 
-                text, 
-                flags=re.IGNORECASE if not use_regex else 0
-            )
-            return highlighted
-        except:
-            return text
-
-    def search_finished(self, results, keyword):
+            return re.compile(keyword, re.IGNORECASE if not use_regex else 0)
+        except re.error:
+            return None
+
+    def append_search_results(self, search_id, results):
+        """暂存搜索线程送来的一批结果，定时合并写入结果模型，避免每批都触发视图更新"""
+        # 已被取代或取消的搜索
+        if search_id != self.search_id:
+            return
+
+        self.pending_results.extend(results)
+        if not self.result_flush_timer.isActive():
+            self.result_flush_timer.start()
+
+    def flush_search_results(self):
+        """把暂存的结果追加到结果模型中"""
+        results, self.pending_results = self.pending_results, []
         if not results:
-            root_item = QTreeWidgetItem(self.results_tree)
-            root_item.setText(0, "未找到匹配项")
-            root_item.setText(1, "")
+            return
+        new_file_rows = self.results_model.append_results(results)
+        # 只展开前10个文件节点
+        for row in new_file_rows:
+            if row < 10:
+                self.results_tree.expand(self.results_model.index(row, 0))
+
+        self.status_bar.showMessage(f"正在搜索 '{self.search_keyword}'... 已找到 {self.results_model.result_count} 个匹配项")
+
+    def search_page_finished(self, search_id, has_more):
+        """一页结果加载完毕，has_more 表示滚动到底部时还能继续加载"""
+        if search_id != self.search_id:
+            return
+        self.result_flush_timer.stop()
+        self.flush_search_results()
+        self.results_model.has_more = has_more
+        if not has_more and not self.results_model.result_count:
+            self.results_model.set_placeholder("未找到匹配项")
+        self.set_search_running(False)
+        self.show_search_status()
+        # 新的一页仍未填满视图时继续加载
+        self.fetch_more_if_needed()
+
+    def search_count_ready(self, search_id, total):
+        """收到匹配总数（-1 表示无法统计）"""
+        if search_id != self.search_id:
+            return
+        self.search_total = total if total >= 0 else None
+        if not self.search_loading:
+            self.show_search_status()
+
+    def show_search_status(self):
+        shown = self.results_model.result_count
+        total = self.search_total
+        if self.search_ranked and shown:
+            files = self.results_model.rowCount()
+            if total is None:
+                self.status_bar.showMessage(f"按相关度显示前 {files} 个文件中的 {shown} 个匹配项。")
+            else:
+                self.status_bar.showMessage(f"按相关度显示前 {files} 个文件中的 {shown} 个匹配项（共 {total} 个匹配项）。")
+        elif self.results_model.has_more:
+            if total is None:
+                self.status_bar.showMessage(f"已显示 {shown} 个匹配项，滚动到底部加载更多。")
+            else:
+                self.status_bar.showMessage(f"已显示 {shown} / {total} 个匹配项，滚动到底部加载更多。")
+        elif self.search_incremental and total is None:
+            # 边输入边搜索不分页，结果被截断时无法统计总数
+            self.status_bar.showMessage(f"搜索完成。找到 {shown} 个匹配项（已达到结果数量上限）。")
         else:
-            # 如果结果太多，限制显示数量
-            max_display = 1000
-            total_results = len(results)
-            
-            if total_results > max_display:
-                # 显示警告
-                warning_item = QTreeWidgetItem(self.results_tree)
-                warning_item.setText(0, f"警告：找到 {total_results} 个结果，仅显示前 {max_display} 个")
-                warning_item.setForeground(0, Qt.red)
-                font = QFont()
-                font.setBold(True)
-                warning_item.setFont(0, font)
-                
-                results = results[:max_display]
-            
-            # 按文件分组结果
-            file_groups = {}
-            for result in results:
-                file_path = result["file_path"]
-                if file_path not in file_groups:
-                    file_groups[file_path] = []
-                file_groups[file_path].append(result)
-            
-            # 添加到树形控件
-            for file_path, file_results in file_groups.items():
-                # 创建文件节点
-                file_item = QTreeWidgetItem(self.results_tree)
-                file_item.setText(0, os.path.basename(file_path))
-                file_item.setText(1, f"({len(file_results)} 个匹配)")
-                file_item.setToolTip(0, file_path)
-                
-                # 设置文件节点字体为粗体
-                font = QFont()
-                font.setBold(True)
-                file_item.setFont(0, font)
-                
-                # 添加行结果
-                for result in file_results:
-                    line_item = QTreeWidgetItem(file_item)
-                    line_item.setText(0, f"行 {result['line_number']}")
-                    
-                    # 高亮显示匹配的文本
-                    use_regex = self.use_regex_checkbox.isChecked()
-                    highlighted_text = self.highlight_keyword(
-                        result['line_content'].strip(), 
-                        keyword, 
-                        use_regex
-                    )
-                    
-                    # 设置富文本显示
-                    line_item.setData(1, Qt.DisplayRole, "")
-                    line_item.setData(1, Qt.UserRole, highlighted_text)
-                    
-                # 只展开前10个文件节点，避免界面卡顿
-                if list(file_groups.keys()).index(file_path) < 10:
-                    file_item.setExpanded(True)
-            
-            # 自定义绘制以显示HTML
-            self.results_tree.setItemDelegate(HTMLDelegate())
-        
-        self.status_bar.showMessage(f"搜索完成。找到 {total_results if 'total_results' in locals() else len(results)} 个匹配项。")
-        self.create_index_button.setEnabled(True)
-        self.update_index_button.setEnabled(True)
-        self.search_button.setEnabled(True)
-        self.search_thread.quit()
-        self.search_thread.wait()
+            self.status_bar.showMessage(f"搜索完成。找到 {shown} 个匹配项。")
 
-    def open_in_vscode(self, item, column):
+    def open_in_vscode(self, index):
         """双击打开VSCode并定位到指定行"""
         try:
-            # 检查是否是行项目（有父项目的才是行项目）
-            if item.parent() is None:
-                # 这是文件节点，不处理
+            # 文件节点没有行号，不处理
+            line_number = index.data(SearchResultModel.LineNumberRole)
+            if line_number is None:
                 return
             
-            # 获取文件路径（从父节点的tooltip）
-            file_item = item.parent()
-            file_path = file_item.toolTip(0)
-            
-            # 获取行号（从当前项的文本中提取）
-            line_text = item.text(0)  # 格式如 "行 123"
-            if line_text.startswith("行 "):
-                try:
-                    line_number = int(line_text.split(" ")[1])
-                except (IndexError, ValueError):
-                    line_number = 1
-            else:
-                line_number = 1
+            file_path = index.data(SearchResultModel.FilePathRole)
             
             # 检查文件是否存在
             if not os.path.exists(file_path):
@@ -501,30 +800,12 @@ class FileSearchApp(QWidget):
         try:
             # VSCode命令行参数：--goto 文件路径:行号:列号
             goto_arg = f"{file_path}:{line_number}:1"
-            
-            # 根据操作系统选择合适的命令
             system = platform.system().lower()
-            
-            if system == "windows":
-                # Windows下尝试不同的VSCode命令和常见安装路径
-                commands = [
-                    "code",
-                    "code.exe",
-                    os.path.join(os.environ.get("ProgramFiles", "C:\\Program Files"), "Microsoft VS Code", "bin", "code.cmd"),
-                    os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local")), "Programs", "Microsoft VS Code", "bin", "code.cmd")
-                ]
-            elif system == "darwin":  # macOS
-                commands = [
-                    "code",
-                    "/usr/local/bin/code",
-                    "/Applications/Visual Studio Code.app/Contents/Resources/app/bin/code"
-                ]
-            else:  # Linux和其他Unix系统
-                commands = [
-                    "code",
-                    "/usr/bin/code",
-                    "/usr/local/bin/code"
-                ]
+
+            # 优先使用检测到的命令，失败时再尝试其他可能的命令
+            commands = vscode_candidates()
+            if self.vscode_command:
+                commands.insert(0, self.vscode_command)
             
             # 尝试每个可能的命令
             for cmd in commands:
@@ -540,6 +821,8 @@ class FileSearchApp(QWidget):
                     
                     # 如果命令成功执行（返回码为0或1都算成功，因为VSCode有时返回1）
                     if result.returncode in [0, 1]:
+                        if cmd != self.vscode_command:
+                            self.vscode_detection_finished(cmd)
                         return True
                         
                 except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
@@ -570,12 +853,22 @@ class FileSearchApp(QWidget):
         except Exception as e:
             QMessageBox.warning(self, "打开失败", f"无法打开文件：{str(e)}\n\n请检查VSCode是否已安装并添加到PATH环境变量中。")
 
-    def check_vscode_availability(self):
-        """检查VSCode是否可用"""
-        # 尝试使用 open_file_in_vscode 中的逻辑来检查
-        # 传入一个虚拟文件路径，因为我们只关心命令是否能执行
-        # 实际不会打开文件
-        return self.open_file_in_vscode("dummy_file.txt", 1)
+    def vscode_detection_finished(self, command):
+        """记录检测到的 VSCode 命令，下次启动时直接使用（未检测到时清除记录）"""
+        self.vscode_command = command
+        if command:
+            self.settings.setValue("editor/vscode_command", command)
+        else:
+            self.settings.remove("editor/vscode_command")
+        self.show_vscode_status()
+
+    def show_vscode_status(self):
+        if "editor" not in self.startup_timings:
+            self.mark_startup("editor")
+            if self.vscode_command:
+                self.status_bar.showMessage("准备就绪 - VSCode已检测到")
+            else:
+                self.status_bar.showMessage("准备就绪 - 未检测到VSCode，将使用默认程序打开文件")
 
     def clear_index_data(self):
         reply = QMessageBox.question(self, '清空索引', '确定要清空所有索引数据吗？此操作不可逆。',
@@ -585,14 +878,14 @@ class FileSearchApp(QWidget):
             self.set_index_buttons_enabled(False)
 
             self.indexer_thread = QThread()
-            self.file_indexer = FileIndexer()
+            self.file_indexer = QtFileIndexer()
             self.file_indexer.moveToThread(self.indexer_thread)
 
             self.file_indexer.indexing_progress.connect(self.update_status)
             self.file_indexer.indexing_error.connect(self.indexing_error)
 
             self.indexer_thread.started.connect(self.file_indexer.clear_index)
-            self.indexer_thread.finished.connect(self.clear_index_finished)
+            self.file_indexer.indexing_finished.connect(self.clear_index_finished)
             self.indexer_thread.start()
 
     def rebuild_database(self):
@@ -606,8 +899,12 @@ class FileSearchApp(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                # 删除数据库文件
+                # 删除数据库文件（先关闭复用的只读连接）
                 db_path = "file_index.db"
+                FileIndexer.close_read_connections(db_path)
+                # 新数据库的索引代数从头开始，丢弃旧数据库的搜索结果缓存
+                if self.search_indexer.result_cache is not None:
+                    self.search_indexer.result_cache.clear()
                 if os.path.exists(db_path):
                     os.remove(db_path)
                     # 也删除可能存在的 WAL 和 SHM 文件
@@ -617,10 +914,11 @@ class FileSearchApp(QWidget):
                         os.remove(db_path + "-shm")
                 
                 # 清空显示
+                self.search_worker.clear_cache()
                 self.index_info_text.clear()
                 self.file_type_table.setRowCount(0)
                 self.index_log_text.clear()
-                self.results_tree.clear()
+                self.results_model.reset()
                 
                 QMessageBox.information(self, "成功", "数据库已重建。请重新创建索引。")
                 self.status_bar.showMessage("数据库已重建")
@@ -632,6 +930,7 @@ class FileSearchApp(QWidget):
                 QMessageBox.critical(self, "错误", f"重建数据库失败：{str(e)}")
     def clear_index_finished(self):
         self.status_bar.showMessage("索引已清空。")
+        self.search_worker.clear_cache()
         self.set_index_buttons_enabled(True)
         self.indexer_thread.quit()
         self.indexer_thread.wait()
@@ -646,55 +945,393 @@ class FileSearchApp(QWidget):
         self.update_index_button.setEnabled(True)
         self.search_button.setEnabled(True)
         self.clear_index_button.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.stop_index_watch()
+        # 取消正在进行的搜索并停止搜索线程
+        self.search_worker.cancel()
         self.search_thread.quit()
         self.search_thread.wait()
+        super().closeEvent(event)
 
 
-# 自定义委托类，用于显示HTML格式的文本
-class HTMLDelegate(QStyledItemDelegate):
-    def paint(self, painter, option, index):
-        if index.column() == 1:  # 只处理第二列（内容列）
-            html_text = index.data(Qt.UserRole)
-            if html_text:
-                painter.save()
-                
-                # 创建文本文档
-                doc = QTextDocument()
-                doc.setHtml(html_text)
-                doc.setTextWidth(option.rect.width())
-                
-                # 处理选中状态
-                if option.state & QStyle.State_Selected:
-                    painter.fillRect(option.rect, option.palette.highlight())
-                    # 设置文本颜色为高亮文本颜色
-                    palette = option.palette
-                    doc.setDefaultStyleSheet(
-                        f"body {{ color: {palette.color(QPalette.HighlightedText).name()}; }}"
-                    )
-                
-                # 绘制文本
-                painter.translate(option.rect.x(), option.rect.y())
-                doc.drawContents(painter)
-                
-                painter.restore()
+# 搜索工作对象，常驻在搜索线程中，按页把结果发送回界面线程
+# 每次搜索有一个编号，开始新搜索时旧搜索被取消（中断正在执行的 SQL），结果和完成信号都带编号
+class SearchWorker(QObject):
+    results_ready = pyqtSignal(int, list)
+    # 一页结果已发送完：(搜索编号, 是否还有下一页)
+    page_done = pyqtSignal(int, bool)
+    # 匹配总数：(搜索编号, 总数)，无法统计时为 -1
+    count_ready = pyqtSignal(int, int)
+    # 索引信息（get_index_info 的结果，可能为 None）
+    index_info_ready = pyqtSignal(object)
+
+    def __init__(self, indexer):
+        super().__init__()
+        self.indexer = indexer
+        self.lock = threading.Lock()
+        self.current_search_id = 0
+        self.cancel_event = threading.Event()
+        # 上一次边输入边搜索的完整结果：(文件夹, 关键词, 结果列表)
+        self.prefix_cache = None
+        # 每次清空缓存加一，防止清空前开始的查询把旧结果写回缓存
+        self.cache_generation = 0
+        # 当前分页搜索：(搜索编号, 关键词, 文件夹, 是否正则, 下一页的起点)
+        self.page_state = None
+
+    def begin_search(self):
+        """取消正在进行的搜索并返回新的搜索编号（在界面线程调用）"""
+        with self.lock:
+            self.cancel_event.set()
+            self.cancel_event = threading.Event()
+            self.current_search_id += 1
+            return self.current_search_id
+
+    def cancel(self):
+        """取消正在进行的搜索（在界面线程调用）"""
+        self.begin_search()
+
+    def clear_cache(self):
+        """索引内容变化后丢弃缓存的前缀搜索结果（在界面线程调用）"""
+        with self.lock:
+            self.prefix_cache = None
+            self.cache_generation += 1
+
+    def load_index_info(self):
+        self.index_info_ready.emit(self.indexer.get_index_info())
+
+    def run(self, search_id, keyword, folder_path, use_regex, incremental, ranked):
+        with self.lock:
+            # 排队期间已被更新的搜索取代
+            if search_id != self.current_search_id:
                 return
-        
-        # 其他情况使用默认绘制
-        super().paint(painter, option, index)
-    
+            cancel_event = self.cancel_event
+
+        if ranked and not use_regex:
+            self.run_ranked(search_id, keyword, folder_path, cancel_event, prefix=incremental)
+            return
+        if incremental and not use_regex:
+            self.run_incremental(search_id, keyword, folder_path, cancel_event)
+            return
+
+        # 先显示第一页，再统计总数
+        self.fetch_page(search_id, (search_id, keyword, folder_path, use_regex, None), cancel_event)
+        if cancel_event.is_set():
+            return
+        total = self.indexer.count_search_results(keyword, folder_path, use_regex, cancel_event=cancel_event)
+        if not cancel_event.is_set():
+            self.count_ready.emit(search_id, -1 if total is None else total)
+
+    def fetch_more(self, search_id):
+        """加载当前搜索的下一页"""
+        with self.lock:
+            state = self.page_state
+            if search_id != self.current_search_id or state is None or state[0] != search_id:
+                return
+            cancel_event = self.cancel_event
+        self.fetch_page(search_id, state, cancel_event)
+
+    def fetch_page(self, search_id, state, cancel_event):
+        _, keyword, folder_path, use_regex, after = state
+        results, next_key = self.indexer.search_page(keyword, folder_path, use_regex, after=after,
+                                                     cancel_event=cancel_event)
+        if cancel_event.is_set():
+            return
+        with self.lock:
+            self.page_state = (search_id, keyword, folder_path, use_regex, next_key) if next_key else None
+        if results:
+            self.results_ready.emit(search_id, results)
+        self.page_done.emit(search_id, next_key is not None)
+
+    def run_ranked(self, search_id, keyword, folder_path, cancel_event, prefix=False):
+        """按相关度搜索：一次性返回得分最高的文件，不分页"""
+        results = self.indexer.search_ranked(keyword, folder_path, cancel_event=cancel_event, prefix=prefix)
+        if cancel_event.is_set():
+            return
+        if results:
+            self.results_ready.emit(search_id, results)
+        self.page_done.emit(search_id, False)
+        total = self.indexer.count_search_results(keyword, folder_path, cancel_event=cancel_event, prefix=prefix,
+                                                  word_match=True)
+        if not cancel_event.is_set():
+            self.count_ready.emit(search_id, -1 if total is None else total)
+
+    def run_incremental(self, search_id, keyword, folder_path, cancel_event):
+        """前缀搜索：新关键词是上次关键词的延长、且能在内存中等价判断时，直接在上次的完整结果中过滤，不再查询数据库"""
+        with self.lock:
+            cached = self.prefix_cache
+            generation = self.cache_generation
+        matches = None
+        if cached and cached[0] == folder_path and keyword.startswith(cached[1]):
+            matches = self.indexer.build_prefix_matcher(keyword)
+        if matches is not None:
+            results = [result for result in cached[2] if matches(result['line_content'])]
+            if results:
+                self.results_ready.emit(search_id, results)
+        else:
+            results = []
+            for batch in self.indexer.iter_search_results(keyword, folder_path, cancel_event=cancel_event,
+                                                          prefix=True):
+                results.extend(batch)
+                self.results_ready.emit(search_id, batch)
+            if cancel_event.is_set():
+                return
+
+        total = len(results)
+        # 结果被截断时无法在其中细化，不缓存，也无法得知总数
+        if total < self.indexer.max_search_results:
+            with self.lock:
+                if generation == self.cache_generation:
+                    self.prefix_cache = (folder_path, keyword, results)
+        else:
+            total = -1
+        self.page_done.emit(search_id, False)
+        self.count_ready.emit(search_id, total)
+
+
+# 搜索结果模型：按文件分组的两级树，结果只以紧凑的 (行号, 内容) 元组保存，
+# 显示文本和高亮位置只在视图请求可见行时才计算，并缓存最近显示过的行
+class SearchResultModel(QAbstractItemModel):
+    FilePathRole = Qt.UserRole + 1
+    LineNumberRole = Qt.UserRole + 2
+    LineContentRole = Qt.UserRole + 3
+    # (显示文本, [(起始, 结束), ...])，由 HighlightDelegate 绘制
+    HighlightRole = Qt.UserRole + 4
+
+    # 缓存高亮位置的行数，滚动时淘汰最久未显示的行
+    highlight_cache_size = 4096
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.file_paths = []
+        self.file_lines = []  # 与 file_paths 一一对应，每项为 [(行号, 内容), ...]
+        self.file_rows = {}   # 文件路径 -> 顶层行号
+        self.result_count = 0
+        self.placeholder = None
+        self.has_more = False  # 分页搜索是否还有下一页
+        self.highlight_pattern = None
+        self.highlight_cache = OrderedDict()
+        self.bold_font = QFont()
+        self.bold_font.setBold(True)
+
+    def reset(self, highlight_pattern=None):
+        """清空结果，highlight_pattern 为用于标出关键词的已编译正则"""
+        self.beginResetModel()
+        self.file_paths = []
+        self.file_lines = []
+        self.file_rows = {}
+        self.result_count = 0
+        self.placeholder = None
+        self.has_more = False
+        self.highlight_pattern = highlight_pattern
+        self.highlight_cache.clear()
+        self.endResetModel()
+
+    def highlight(self, file_row, line_row, content):
+        """返回一行的 (显示文本, 高亮区间)，最近用过的行直接取缓存"""
+        key = (file_row, line_row)
+        cached = self.highlight_cache.get(key)
+        if cached is not None:
+            self.highlight_cache.move_to_end(key)
+            return cached
+
+        text = content.strip()
+        spans = []
+        if self.highlight_pattern is not None:
+            spans = [match.span() for match in self.highlight_pattern.finditer(text)
+                     if match.end() > match.start()]
+        cached = self.highlight_cache[key] = (text, spans)
+        if len(self.highlight_cache) > self.highlight_cache_size:
+            self.highlight_cache.popitem(last=False)
+        return cached
+
+    def set_placeholder(self, text):
+        """没有结果时显示一行提示"""
+        self.beginResetModel()
+        self.placeholder = text
+        self.endResetModel()
+
+    def append_results(self, results):
+        """追加一批结果（同一文件的结果是连续的），返回新增文件节点的行号"""
+        new_file_rows = []
+        grown_file_rows = []
+        start = 0
+        while start < len(results):
+            file_path = results[start]['file_path']
+            end = start + 1
+            while end < len(results) and results[end]['file_path'] == file_path:
+                end += 1
+            lines = [(result['line_number'], result['line_content']) for result in results[start:end]]
+
+            file_row = self.file_rows.get(file_path)
+            if file_row is None:
+                file_row = len(self.file_paths)
+                self.beginInsertRows(QModelIndex(), file_row, file_row)
+                self.file_paths.append(file_path)
+                self.file_lines.append(lines)
+                self.file_rows[file_path] = file_row
+                self.endInsertRows()
+                new_file_rows.append(file_row)
+            else:
+                file_lines = self.file_lines[file_row]
+                self.beginInsertRows(self.index(file_row, 0), len(file_lines), len(file_lines) + len(lines) - 1)
+                file_lines.extend(lines)
+                self.endInsertRows()
+                grown_file_rows.append(file_row)
+
+            self.result_count += len(lines)
+            start = end
+
+        # 文件节点上显示的匹配数随之变化（整批只通知一次）
+        if grown_file_rows:
+            self.dataChanged.emit(self.index(grown_file_rows[0], 1), self.index(grown_file_rows[-1], 1))
+        return new_file_rows
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        # 内部 id：文件节点为 0，行节点为所属文件的行号加一
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        if not parent.isValid():
+            if self.placeholder is not None:
+                return 1
+            return len(self.file_paths)
+        if parent.internalId() == 0 and self.placeholder is None:
+            return len(self.file_lines[parent.row()])
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ["文件/行号", "内容"][section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column, file_id = index.row(), index.column(), index.internalId()
+
+        if file_id == 0:
+            if self.placeholder is not None:
+                return self.placeholder if role == Qt.DisplayRole and column == 0 else None
+            file_path = self.file_paths[row]
+            if role == Qt.DisplayRole:
+                if column == 0:
+                    return os.path.basename(file_path)
+                return f"({len(self.file_lines[row])} 个匹配)"
+            if role == Qt.ToolTipRole and column == 0:
+                return file_path
+            if role == Qt.FontRole and column == 0:
+                return self.bold_font
+            if role == self.FilePathRole:
+                return file_path
+            return None
+
+        line_number, content = self.file_lines[file_id - 1][row]
+        if role == Qt.DisplayRole:
+            return f"行 {line_number}" if column == 0 else ""
+        if role == self.HighlightRole and column == 1:
+            return self.highlight(file_id - 1, row, content)
+        if role == self.FilePathRole:
+            return self.file_paths[file_id - 1]
+        if role == self.LineNumberRole:
+            return line_number
+        if role == self.LineContentRole:
+            return content
+        return None
+
+
+# 自定义委托类，直接用 QPainter 绘制带高亮的文本，不再为每行解析 HTML
+class HighlightDelegate(QStyledItemDelegate):
+    highlight_color = QColor("yellow")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 字体 -> (普通字体度量, 粗体, 粗体度量)，字体不变时不重复创建
+        self.font_cache = {}
+
+    def fonts_for(self, font):
+        key = font.key()
+        fonts = self.font_cache.get(key)
+        if fonts is None:
+            bold_font = QFont(font)
+            bold_font.setBold(True)
+            fonts = self.font_cache[key] = (QFontMetrics(font), bold_font, QFontMetrics(bold_font))
+        return fonts
+
+    def paint(self, painter, option, index):
+        highlighted = index.data(SearchResultModel.HighlightRole) if index.column() == 1 else None
+        if highlighted is None:
+            # 其他情况使用默认绘制
+            super().paint(painter, option, index)
+            return
+
+        text, spans = highlighted
+        # 背景（交替行颜色、选中状态）仍交给样式绘制
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, opt, painter, opt.widget)
+
+        metrics, bold_font, bold_metrics = self.fonts_for(option.font)
+        selected = option.state & QStyle.State_Selected
+        text_color = option.palette.highlightedText().color() if selected else option.palette.text().color()
+        rect = option.rect.adjusted(3, 0, -3, 0)
+        right = rect.right()
+
+        painter.save()
+        painter.setClipRect(option.rect)
+        x = rect.x()
+        position = 0
+        # 依次绘制普通片段和高亮片段，超出可见宽度后停止
+        for start, end in spans + [(len(text), len(text))]:
+            if position < start and x <= right:
+                run = text[position:start]
+                width = metrics.horizontalAdvance(run)
+                painter.setFont(option.font)
+                painter.setPen(text_color)
+                painter.drawText(x, rect.y(), width, rect.height(), Qt.AlignVCenter | Qt.TextSingleLine, run)
+                x += width
+            if start < end and x <= right:
+                run = text[start:end]
+                width = bold_metrics.horizontalAdvance(run)
+                painter.fillRect(x, rect.y(), width, rect.height(), self.highlight_color)
+                painter.setFont(bold_font)
+                painter.setPen(Qt.black)
+                painter.drawText(x, rect.y(), width, rect.height(), Qt.AlignVCenter | Qt.TextSingleLine, run)
+                x += width
+            position = end
+            if x > right:
+                break
+        painter.restore()
+
     def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
         if index.column() == 1:
-            html_text = index.data(Qt.UserRole)
-            if html_text:
-                doc = QTextDocument()
-                doc.setHtml(html_text)
-                doc.setTextWidth(option.rect.width() if option.rect.width() > 0 else 300)
-                return QSize(int(doc.idealWidth()), int(doc.size().height()))
-        
-        return super().sizeHint(option, index)
+            # 单行文本，高度由字体决定，不必测量内容
+            metrics, _, bold_metrics = self.fonts_for(option.font)
+            size.setHeight(max(size.height(), metrics.height(), bold_metrics.height()) + 2)
+        return size
 
 
 if __name__ == "__main__":
+    # 打包成可执行文件后，并行正则扫描的工作进程需要由此进入（未打包时不必导入 multiprocessing）
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = FileSearchApp()
     window.show()
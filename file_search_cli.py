@@ -0,0 +1,139 @@
+"""命令行入口：不需要 PyQt5，可用于服务器上的批量索引或在管道中使用搜索结果
+
+    python -m file_search_cli index 文件夹          创建新索引（清空旧索引）
+    python -m file_search_cli update 文件夹         增量更新索引
+    python -m file_search_cli search 关键词         搜索，每个结果输出一行 JSON
+    python -m file_search_cli stats                 输出索引统计信息（JSON）
+
+进度和错误消息输出到标准错误，结果输出到标准输出
+"""
+import argparse
+import json
+import os
+import sys
+
+from file_indexer import FileIndexer, HASH_ALGORITHMS
+
+
+def print_message(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m file_search_cli", description="文件内容索引和搜索")
+    parser.add_argument("--db", default="file_index.db", help="索引数据库路径（默认 file_index.db）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度消息")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("index", "创建新索引（清空旧索引）"), ("update", "增量更新索引")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("folder", help="要索引的文件夹")
+        command.add_argument("--max-file-size", type=int, default=5, help="最大文件大小（MB，默认 5）")
+        command.add_argument("--large-files", action="store_true", help="大文件模式：不跳过大文件，超长行切分索引")
+        command.add_argument("--file-budget", type=int, default=256,
+                             help="大文件模式下单文件索引上限（MB，0 表示不限制，默认 256）")
+        command.add_argument("--scan-threads", type=int, default=1, help="目录扫描线程数（默认 1）")
+        command.add_argument("--trigram", action="store_true", help="建立三元组索引")
+        command.add_argument("--hash", dest="hash_algorithm", choices=list(HASH_ALGORITHMS), default=None,
+                             help="文件哈希算法")
+        if name == "index":
+            command.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 8),
+                                 help="并行索引线程数（0 表示单线程）")
+            command.add_argument("--chunk", action="store_true", help="按块存储文件内容")
+        else:
+            command.add_argument("--paranoid", action="store_true", help="对所有文件计算哈希（较慢）")
+
+    command = commands.add_parser("search", help="搜索，每个结果输出一行 JSON")
+    command.add_argument("keyword", help="搜索关键词")
+    command.add_argument("--folder", default=None, help="只搜索该文件夹（含子文件夹）")
+    command.add_argument("--regex", action="store_true", help="按正则表达式搜索")
+    command.add_argument("--ranked", action="store_true", help="按相关度排序（需要 FTS5 索引）")
+    command.add_argument("--words", action="store_true",
+                         help="按完整的词匹配（使用 FTS5 索引，更快），默认按子串匹配")
+    command.add_argument("--limit", type=int, default=None, help="最多输出的结果数")
+    command.add_argument("--regex-workers", type=int, default=0,
+                         help="无法用索引缩小范围的正则搜索使用的扫描进程数（默认 0，不并行）")
+
+    commands.add_parser("stats", help="输出索引统计信息（JSON）")
+    return parser
+
+
+def run_index(indexer, args):
+    indexer.max_file_size = args.max_file_size * 1024 * 1024
+    indexer.large_file_mode = args.large_files
+    indexer.file_byte_budget = args.file_budget * 1024 * 1024
+    indexer.scan_threads = args.scan_threads
+    indexer.trigram_index = args.trigram
+    if args.hash_algorithm:
+        indexer.hash_algorithm = args.hash_algorithm
+    folder_path = os.path.abspath(args.folder)
+    if args.command == "index":
+        indexer.index_workers = args.workers
+        indexer.storage_layout = 'chunk' if args.chunk else 'line'
+        indexer.index_folder(folder_path)
+    else:
+        indexer.paranoid_check = args.paranoid
+        indexer.update_index(folder_path)
+
+
+def run_search(indexer, args):
+    indexer.regex_scan_workers = args.regex_workers
+    indexer.substring_search = not args.words
+    if args.limit is not None:
+        indexer.max_search_results = args.limit
+    folder_path = os.path.abspath(args.folder) if args.folder else None
+    if args.ranked and not args.regex:
+        batches = [indexer.search_ranked(args.keyword, folder_path)]
+    else:
+        batches = indexer.iter_search_results(args.keyword, folder_path, args.regex)
+
+    out = sys.stdout
+    count = 0
+    for batch in batches:
+        for result in batch:
+            if args.limit is not None and count >= args.limit:
+                return
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+        out.flush()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    errors = []
+
+    def report_error(message):
+        errors.append(message)
+        print_message(f"错误: {message}")
+
+    if args.command in ("search", "stats") and not os.path.isfile(args.db):
+        # 只读命令不创建数据库：打开不存在的路径会建立一个空索引
+        print_message(f"错误: 索引数据库不存在: {args.db}")
+        return 2
+
+    indexer = FileIndexer(args.db, progress_callback=None if args.quiet else print_message,
+                          error_callback=report_error)
+
+    if args.command in ("index", "update"):
+        if not os.path.isdir(args.folder):
+            print_message(f"错误: 文件夹不存在: {args.folder}")
+            return 2
+        run_index(indexer, args)
+    elif args.command == "search":
+        try:
+            run_search(indexer, args)
+        except BrokenPipeError:
+            # 下游程序（如 head）提前关闭了管道
+            sys.stdout = None
+            return 0
+    else:
+        info = indexer.get_index_info()
+        if info is None:
+            print_message("错误: 无法读取索引信息")
+            return 1
+        print(json.dumps(info, ensure_ascii=False, indent=2))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
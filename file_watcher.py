@@ -0,0 +1,238 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+import time
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# inotify 事件类型（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """通过 ctypes 调用 Linux 的 inotify 接口，监视文件夹树中每个（未被跳过的）目录"""
+
+    def __init__(self, indexer, roots):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify 仅在 Linux 上可用")
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        # IN_NONBLOCK / IN_CLOEXEC 与 O_NONBLOCK / O_CLOEXEC 的取值相同
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.indexer = indexer
+        self.roots = list(roots)
+        # 数据库在被监视的文件夹内时，忽略写入索引本身引起的变化，否则每批写入都会触发下一批
+        self.ignored_paths = indexer.database_files()
+        self.watches = {}  # 监视描述符 -> 目录路径
+        try:
+            for root in self.roots:
+                self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, dir_path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if errno in (2, 20):  # ENOENT / ENOTDIR：目录在添加监视前已被删除
+                return
+            # ENOSPC 表示超过了 fs.inotify.max_user_watches
+            raise OSError(errno, f"无法监视 {dir_path}: {os.strerror(errno)}")
+        self.watches[wd] = dir_path
+
+    def add_tree(self, dir_path):
+        """监视目录及其下所有未被跳过的子目录"""
+        stack = [dir_path]
+        while stack:
+            path = stack.pop()
+            self.add_watch(path)
+            stack.extend(self.indexer.scan_directory(path)[1])
+
+    def remove_tree(self, dir_path):
+        """目录被移走后其监视描述符仍指向旧路径，移除该目录及其下的监视"""
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        for wd, path in list(self.watches.items()):
+            if path == dir_path or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read_changes(self, timeout):
+        """等待最多 timeout 秒，返回发生变化的路径集合（文件或目录）"""
+        changes = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changes
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changes
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，丢失的变化只能通过重新检查整个文件夹找回
+                changes.update(self.roots)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            dir_path = self.watches.get(wd)
+            if dir_path is None or not name:
+                continue
+
+            path = os.path.join(dir_path, name)
+            if os.path.abspath(path) in self.ignored_paths:
+                continue
+            if mask & IN_ISDIR:
+                if self.indexer.should_skip_directory(name):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                elif mask & IN_MOVED_FROM:
+                    self.remove_tree(path)
+            changes.add(path)
+        return changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """无法使用 inotify 时的替代方案：定期遍历文件夹，按 (大小, 修改时间, inode) 找出变化的文件"""
+
+    def __init__(self, indexer, roots, interval=5.0):
+        self.indexer = indexer
+        self.roots = list(roots)
+        self.interval = interval
+        self.ignored_paths = indexer.database_files()
+        self.snapshot = self.take_snapshot()
+        self.next_poll = time.monotonic() + interval
+
+    def take_snapshot(self):
+        snapshot = {}
+        for root in self.roots:
+            for dir_path, entries in self.indexer.walk_files(root):
+                for entry in entries:
+                    if os.path.abspath(entry.path) in self.ignored_paths:
+                        continue
+                    file_stat = self.indexer.get_entry_stat(entry)
+                    if file_stat is not None:
+                        snapshot[entry.path] = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        return snapshot
+
+    def read_changes(self, timeout):
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self.next_poll = time.monotonic() + self.interval
+
+        snapshot = self.take_snapshot()
+        old = self.snapshot
+        self.snapshot = snapshot
+        changes = {path for path, info in snapshot.items() if old.get(path) != info}
+        changes.update(path for path in old if path not in snapshot)
+        return changes
+
+    def close(self):
+        pass
+
+
+# 监视工作对象，常驻在监视线程中：订阅文件夹的变化，把一段时间内的变化合并成一批，只重新索引变化的路径
+# 使用自己的 FileIndexer（每批打开一个写连接），与手动的索引操作由 SQLite 的写锁串行化
+class IndexWatcher(QObject):
+    # 一批变化已写入索引：(新增 + 更新 + 删除的文件数)
+    batch_indexed = pyqtSignal(int)
+    watch_message = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, indexer, roots):
+        super().__init__()
+        self.indexer = indexer
+        self.roots = list(roots)
+        # 最后一个事件之后安静多久才写入索引；持续有事件时最长等待多久也要写入一次
+        self.debounce_seconds = 1.0
+        self.max_delay_seconds = 10.0
+        # 轮询模式下两次遍历的间隔
+        self.poll_interval = 5.0
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def create_watcher(self):
+        try:
+            watcher = InotifyWatcher(self.indexer, self.roots)
+            self.watch_message.emit(f"正在监视文件变化（inotify，{len(watcher.watches)} 个目录）")
+            return watcher
+        except (OSError, AttributeError) as e:
+            self.watch_message.emit(f"无法使用 inotify（{e}），改为每 {self.poll_interval:g} 秒检查一次文件变化")
+            return PollingWatcher(self.indexer, self.roots, self.poll_interval)
+
+    def run(self):
+        watcher = self.create_watcher()
+        pending = set()
+        first_event = last_event = None
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    changes = watcher.read_changes(0.2)
+                except OSError as e:
+                    # 例如新建的目录过多，超过了 inotify 的监视数量上限
+                    watcher.close()
+                    self.watch_message.emit(f"监视文件变化出错（{e}），改为每 {self.poll_interval:g} 秒检查一次")
+                    watcher = PollingWatcher(self.indexer, self.roots, self.poll_interval)
+                    changes = set(self.roots)
+                now = time.monotonic()
+                if changes:
+                    pending |= changes
+                    last_event = now
+                    if first_event is None:
+                        first_event = now
+                if not pending:
+                    continue
+                if now - last_event < self.debounce_seconds and now - first_event < self.max_delay_seconds:
+                    continue
+
+                batch = pending
+                pending = set()
+                first_event = None
+                stats = self.indexer.update_paths(batch)
+                if stats is None:
+                    # 写入失败（例如数据库正被其他索引操作锁住），稍后重试
+                    pending |= batch
+                    first_event = last_event = time.monotonic()
+                    continue
+                changed = stats['new'] + stats['updated'] + stats['deleted']
+                if changed:
+                    self.watch_message.emit(f"实时更新：{self.indexer.format_update_stats(stats)}")
+                self.batch_indexed.emit(changed)
+        finally:
+            watcher.close()
+            self.finished.emit()
@@ -0,0 +1,60 @@
+x = 1
+yy
+x = 4
+yy
+x = 1
+yy
+x = 6
+yy
+x = 3
+yy
+x = 8
+yy
+x = 8
+yy
+x = 3
+yy
+x = 5
+yy
+x = 5
+yy
+x = 8
+yy
+x = 6
+yy
+x = 9
+yy
+x = 7
+yy
+x = 1
+yy
+x = 2
+yy
+x = 7
+yy
+x = 8
+yy
+x = 8
+yy
+x = 9
+yy
+x = 8
+yy
+x = 8
+yy
+x = 0
+yy
+x = 4
+yy
+x = 2
+yy
+x = 3
+yy
+x = 5
+yy
+x = 6
+yy
+x = 8
+yy
+x = 5
+yy
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from file_indexer import FileIndexer
+
+
+class LockedBatchIndexer(FileIndexer):
+    """连接数据库后由另一个连接占住写锁，模拟实时更新的一批变化与手动索引操作同时写入"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.blocker = None
+
+    def connect_db(self):
+        if not super().connect_db():
+            return False
+        self.conn.execute("PRAGMA busy_timeout=0")
+        self.blocker = sqlite3.connect(self.db_path)
+        self.blocker.execute("BEGIN IMMEDIATE")
+        return True
+
+
+class UpdatePathsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.temp_dir.name, "src")
+        os.makedirs(self.root)
+        self.db_path = os.path.join(self.temp_dir.name, "index.db")
+        self.write_file("a.py", "alpha = 1\n")
+        indexer = FileIndexer(self.db_path)
+        indexer.index_workers = 0
+        indexer.index_folder(self.root)
+
+    def tearDown(self):
+        FileIndexer.close_read_connections(self.db_path)
+        self.temp_dir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_locked_database_fails_batch_for_retry(self):
+        path = self.write_file("b.py", "beta = 2\n")
+        errors = []
+        indexer = LockedBatchIndexer(self.db_path)
+        indexer.error_callback = errors.append
+        try:
+            # 写锁被占用时整批失败（返回 None），而不是把文件记为处理出错后提交
+            self.assertIsNone(indexer.update_paths({path}))
+        finally:
+            indexer.blocker.rollback()
+            indexer.blocker.close()
+        self.assertEqual(errors, [])
+
+        # 锁释放后重试同一批即可写入
+        stats = FileIndexer(self.db_path).update_paths({path})
+        self.assertEqual(stats['new'], 1)
+        self.assertEqual(stats['errors'], 0)
+        results = FileIndexer(self.db_path).search_content("beta")
+        self.assertEqual([result['file_path'] for result in results], [path])
+
+
+if __name__ == "__main__":
+    unittest.main()